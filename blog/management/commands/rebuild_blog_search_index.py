@@ -0,0 +1,25 @@
+"""
+Comando para reconstruir los índices de búsqueda y de tags del blog.
+Uso: python manage.py rebuild_blog_search_index
+
+Necesario una vez para los posts existentes; luego cada post se reindexa al guardarse.
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from blog.models import BlogPost
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice invertido de búsqueda y el índice de tags de todos los posts del blog'
+
+    def handle(self, *args, **options):
+        count = 0
+        for post in BlogPost.objects.only('id', 'title', 'excerpt', 'content', 'tags').iterator():
+            with transaction.atomic():
+                post.update_search_index()
+                post.update_tag_index()
+            count += 1
+        
+        self.stdout.write(self.style.SUCCESS(f'Índices de búsqueda y tags reconstruidos para {count} posts'))
@@ -1,7 +1,88 @@
-from django.db import models
+import re
+import unicodedata
+from collections import Counter
+from functools import reduce
+from operator import or_
+from django.db import models, transaction
+from django.db.models import Case, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.core.cache import cache
 from django.utils.text import slugify
 from django.conf import settings
 
+# Vistas pendientes de escribir en la base, por post (cache compartida)
+PENDING_VIEWS_KEY = 'blog:views:pending:{pk}'
+
+# Peso de cada campo en el índice de búsqueda
+SEARCH_FIELD_WEIGHTS = {'title': 5, 'excerpt': 2, 'content': 1}
+SEARCH_MIN_TERM_LENGTH = 2
+SEARCH_MAX_TERM_LENGTH = 50
+
+
+def tokenize_search_text(text):
+    """
+    Normaliza un texto para el índice de búsqueda: minúsculas, sin tildes,
+    separado en palabras de al menos SEARCH_MIN_TERM_LENGTH caracteres.
+    """
+    text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode('ascii')
+    return [
+        word[:SEARCH_MAX_TERM_LENGTH]
+        for word in re.findall(r'\w+', text.lower())
+        if len(word) >= SEARCH_MIN_TERM_LENGTH
+    ]
+
+
+class BlogPostQuerySet(models.QuerySet):
+    """QuerySet de posts con búsqueda sobre el índice invertido."""
+
+    def search(self, query):
+        """
+        Filtra los posts que contienen todas las palabras de la búsqueda
+        (como prefijo, ej: "empa" encuentra "empanadas") y los ordena por
+        relevancia (suma de pesos de los términos encontrados).
+        """
+        words = list(dict.fromkeys(tokenize_search_text(query)))
+        if not words:
+            return self.none()
+        
+        queryset = self
+        for word in words:
+            # Cada palabra usa el índice (term, post) con LIKE 'palabra%'. En MySQL
+            # istartswith compila a LIKE simple (con la collation de la columna);
+            # startswith usaría LIKE BINARY, que no aprovecha el índice. Los
+            # términos se guardan en minúsculas, así que el resultado es el mismo.
+            queryset = queryset.filter(
+                pk__in=BlogSearchTerm.objects.filter(term__istartswith=word).values('post_id')
+            )
+        
+        rank = BlogSearchTerm.objects.filter(
+            reduce(or_, [Q(term__istartswith=word) for word in words]),
+            post=OuterRef('pk')
+        ).order_by().values('post').annotate(total=Sum('weight')).values('total')[:1]
+        
+        return queryset.annotate(search_rank=Subquery(rank)).order_by('-search_rank', '-published_date')
+
+    def with_tags(self, tags, match='any'):
+        """
+        Filtra por tags usando el índice BlogPostTag.
+        
+        Args:
+            tags: Nombres de tags (se comparan normalizados con slugify)
+            match: 'any' (al menos uno) o 'all' (todos)
+        """
+        slugs = list(dict.fromkeys(slugify(tag) for tag in tags if slugify(tag)))
+        if not slugs:
+            return self
+        
+        if match == 'all':
+            queryset = self
+            for slug in slugs:
+                queryset = queryset.filter(
+                    pk__in=BlogPostTag.objects.filter(tag__slug=slug).values('post_id')
+                )
+            return queryset
+        
+        return self.filter(pk__in=BlogPostTag.objects.filter(tag__slug__in=slugs).values('post_id'))
+
 
 class BlogPost(models.Model):
     """Publicaciones del blog del restaurante."""
@@ -115,6 +196,8 @@ class BlogPost(models.Model):
             models.Index(fields=['status']),
         ]
     
+    objects = BlogPostQuerySet.as_manager()
+    
     def __str__(self):
         return self.title
     
@@ -136,7 +219,47 @@ class BlogPost(models.Model):
             else:
                 self.author_name = str(self.author)
         
-        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            
+            # Reindexar solo si cambió algún campo buscable
+            if update_fields is None or set(update_fields) & set(SEARCH_FIELD_WEIGHTS):
+                self.update_search_index()
+            if update_fields is None or 'tags' in update_fields:
+                self.update_tag_index()
+    
+    def update_search_index(self):
+        """Reconstruye los términos de búsqueda de este post."""
+        weights = Counter()
+        for field, weight in SEARCH_FIELD_WEIGHTS.items():
+            for word in tokenize_search_text(getattr(self, field)):
+                weights[word] += weight
+        
+        BlogSearchTerm.objects.filter(post=self).delete()
+        BlogSearchTerm.objects.bulk_create([
+            BlogSearchTerm(post=self, term=term, weight=weight)
+            for term, weight in weights.items()
+        ])
+    
+    def update_tag_index(self):
+        """Sincroniza la tabla BlogPostTag con el campo JSON tags."""
+        names = {}
+        for name in self.tags or []:
+            if isinstance(name, str) and slugify(name):
+                names.setdefault(slugify(name), name.strip())
+        
+        BlogTag.objects.bulk_create(
+            [BlogTag(slug=slug, name=name) for slug, name in names.items()],
+            ignore_conflicts=True
+        )
+        tag_ids = list(BlogTag.objects.filter(slug__in=names).values_list('id', flat=True))
+        
+        BlogPostTag.objects.filter(post=self).exclude(tag_id__in=tag_ids).delete()
+        BlogPostTag.objects.bulk_create(
+            [BlogPostTag(post=self, tag_id=tag_id) for tag_id in tag_ids],
+            ignore_conflicts=True
+        )
     
     def get_author_display(self):
         """Retorna el nombre del autor para mostrar."""
@@ -149,6 +272,139 @@ class BlogPost(models.Model):
         return 'Anónimo'
     
     def increment_views(self):
-        """Incrementa el contador de vistas."""
+        """
+        Incrementa el contador de vistas.
+        
+        La vista se acumula en la cache compartida (incremento atómico) y se
+        escribe en la base periódicamente con flush_pending_views(), en lugar
+        de un UPDATE por cada visita.
+        """
+        key = PENDING_VIEWS_KEY.format(pk=self.pk)
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
         self.views_count += 1
-        self.save(update_fields=['views_count'])
+
+    @classmethod
+    def add_pending_views(cls, posts):
+        """
+        Suma a views_count de cada post las vistas aún no escritas en la base.
+        Modifica las instancias en memoria (una sola lectura de la cache).
+        """
+        posts = list(posts)
+        keys = {PENDING_VIEWS_KEY.format(pk=post.pk): post for post in posts}
+        for key, pending in cache.get_many(keys).items():
+            keys[key].views_count += pending
+        return posts
+
+    @classmethod
+    def flush_pending_views(cls, post_ids=None):
+        """
+        Escribe las vistas acumuladas con un solo UPDATE
+        (views_count = views_count + delta por post).
+        
+        Args:
+            post_ids: IDs a revisar (por defecto todos los posts)
+            
+        Returns:
+            dict: {post_id: vistas escritas}
+        """
+        if post_ids is None:
+            post_ids = cls.objects.order_by().values_list('pk', flat=True)
+        keys = {PENDING_VIEWS_KEY.format(pk=pk): pk for pk in post_ids}
+        
+        deltas = {}
+        for key, pending in cache.get_many(keys).items():
+            if pending > 0:
+                # Descontar primero: las vistas que lleguen mientras tanto quedan pendientes
+                cache.decr(key, pending)
+                deltas[keys[key]] = pending
+        
+        if not deltas:
+            return {}
+        
+        try:
+            cls.objects.filter(pk__in=deltas).update(
+                views_count=F('views_count') + Case(
+                    *[When(pk=pk, then=Value(delta)) for pk, delta in deltas.items()],
+                    default=Value(0),
+                    output_field=models.PositiveIntegerField()
+                )
+            )
+        except Exception:
+            # Devolver las vistas a la cache para el siguiente intento
+            for pk, delta in deltas.items():
+                cache.incr(PENDING_VIEWS_KEY.format(pk=pk), delta)
+            raise
+        
+        return deltas
+
+
+
+class BlogSearchTerm(models.Model):
+    """
+    Índice invertido de búsqueda del blog: un término por post con su peso
+    (ocurrencias ponderadas por campo, ver SEARCH_FIELD_WEIGHTS).
+    """
+    post = models.ForeignKey(
+        BlogPost,
+        on_delete=models.CASCADE,
+        related_name='search_terms',
+        verbose_name='Artículo'
+    )
+    term = models.CharField(max_length=SEARCH_MAX_TERM_LENGTH, verbose_name='Término')
+    weight = models.PositiveIntegerField(default=1, verbose_name='Peso')
+    
+    class Meta:
+        verbose_name = 'Término de Búsqueda'
+        verbose_name_plural = 'Términos de Búsqueda'
+        unique_together = [['post', 'term']]
+        indexes = [
+            # Búsqueda por prefijo: WHERE term LIKE 'x%'
+            models.Index(fields=['term', 'post']),
+        ]
+    
+    def __str__(self):
+        return f"{self.term} ({self.post_id})"
+
+
+
+class BlogTag(models.Model):
+    """Tag normalizado del blog (índice del campo JSON BlogPost.tags)."""
+    name = models.CharField(max_length=100, verbose_name='Nombre')
+    slug = models.SlugField(max_length=100, unique=True, verbose_name='Slug')
+    
+    class Meta:
+        verbose_name = 'Tag'
+        verbose_name_plural = 'Tags'
+        ordering = ['name']
+    
+    def __str__(self):
+        return self.name
+
+
+class BlogPostTag(models.Model):
+    """Relación post-tag, mantenida al guardar el post."""
+    post = models.ForeignKey(
+        BlogPost,
+        on_delete=models.CASCADE,
+        related_name='tag_links',
+        verbose_name='Artículo'
+    )
+    tag = models.ForeignKey(
+        BlogTag,
+        on_delete=models.CASCADE,
+        related_name='post_links',
+        verbose_name='Tag'
+    )
+    
+    class Meta:
+        verbose_name = 'Tag de Artículo'
+        verbose_name_plural = 'Tags de Artículos'
+        unique_together = [['post', 'tag']]
+        indexes = [
+            # Filtro por tag: WHERE tag_id = x -> post_id
+            models.Index(fields=['tag', 'post']),
+        ]
+    
+    def __str__(self):
+        return f"{self.post_id} - {self.tag_id}"
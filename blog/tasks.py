@@ -0,0 +1,25 @@
+"""
+Tareas de Celery para la aplicación Blog.
+"""
+
+import logging
+from celery import shared_task
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def flush_blog_view_counts():
+    """
+    Tarea programada que escribe en la base las vistas acumuladas de los posts.
+    """
+    from blog.models import BlogPost
+    
+    deltas = BlogPost.flush_pending_views()
+    if deltas:
+        logger.info(f"Vistas del blog escritas: {sum(deltas.values())} en {len(deltas)} posts")
+    
+    return {
+        'posts_updated': len(deltas),
+        'views_flushed': sum(deltas.values()),
+    }
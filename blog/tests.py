@@ -0,0 +1,142 @@
+"""
+Tests para la aplicación Blog.
+"""
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+from .models import BlogPost
+
+
+class BlogViewCounterTest(TestCase):
+    """Tests para el contador de vistas con escritura diferida."""
+
+    def setUp(self):
+        cache.clear()
+        self.post = BlogPost.objects.create(
+            title='Nuevo menú de invierno',
+            content='Contenido',
+            status='published',
+            published_date=timezone.now(),
+        )
+
+    def test_views_are_buffered_and_flushed(self):
+        """Test las vistas se acumulan y se escriben con un solo UPDATE."""
+        url = f'/api/website/blog/{self.post.slug}/'
+        for _ in range(3):
+            response = self.client.get(url)
+
+        self.assertEqual(response.json()['views_count'], 3)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views_count, 0)
+
+        with self.assertNumQueries(2):
+            deltas = BlogPost.flush_pending_views()
+
+        self.assertEqual(deltas, {self.post.pk: 3})
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views_count, 3)
+        self.assertEqual(BlogPost.flush_pending_views(), {})
+
+    def test_list_includes_pending_views(self):
+        """Test el listado muestra las vistas de la base más las pendientes."""
+        self.post.increment_views()
+        self.post.increment_views()
+
+        response = self.client.get('/api/website/blog/')
+
+        self.assertEqual(response.json()['results'][0]['views_count'], 2)
+
+    def test_detail_etag_is_weak_and_counts_304(self):
+        """Test el ETag del detalle es débil y un 304 también suma la vista."""
+        url = f'/api/website/blog/{self.post.slug}/'
+        etag = self.client.get(url)['ETag']
+        self.assertTrue(etag.startswith('W/'))
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag.removeprefix('W/'))
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(BlogPost.flush_pending_views(), {self.post.pk: 3})
+
+
+class BlogSearchTest(TestCase):
+    """Tests para la búsqueda sobre el índice invertido."""
+
+    def setUp(self):
+        cache.clear()
+        self.soup = BlogPost.objects.create(
+            title='Sopa de invierno',
+            content='Una receta de empanadas y caldo casero.',
+            status='published',
+            published_date=timezone.now(),
+        )
+        self.empanadas = BlogPost.objects.create(
+            title='Empanadas de pino',
+            content='Las mejores empanadas de la temporada.',
+            status='published',
+            published_date=timezone.now(),
+        )
+
+    def test_search_ranks_by_relevance(self):
+        """Test búsqueda por prefijo, sin tildes y ordenada por relevancia."""
+        results = list(BlogPost.objects.search('EMPANÁ'))
+        self.assertEqual(results, [self.empanadas, self.soup])
+
+        self.assertEqual(list(BlogPost.objects.search('empanadas caldo')), [self.soup])
+        self.assertEqual(list(BlogPost.objects.search('x')), [])
+
+    def test_index_is_updated_on_save(self):
+        """Test el índice se actualiza al editar el post."""
+        self.soup.title = 'Cazuela de vacuno'
+        self.soup.save()
+
+        self.assertEqual(list(BlogPost.objects.search('sopa')), [])
+        self.assertEqual(list(BlogPost.objects.search('cazuela')), [self.soup])
+
+    def test_search_param_in_list_view(self):
+        """Test el parámetro search del listado usa el índice."""
+        response = self.client.get('/api/website/blog/', {'search': 'pino'})
+
+        self.assertEqual([p['id'] for p in response.json()['results']], [self.empanadas.id])
+
+
+class BlogTagIndexTest(TestCase):
+    """Tests para el índice normalizado de tags."""
+
+    def setUp(self):
+        cache.clear()
+        self.vegan = BlogPost.objects.create(
+            title='Menú vegano', content='...', status='published',
+            published_date=timezone.now(), tags=['Vegano', 'Invierno'],
+        )
+        self.soup = BlogPost.objects.create(
+            title='Sopas', content='...', status='published',
+            published_date=timezone.now(), tags=['invierno'],
+        )
+        BlogPost.objects.create(title='Borrador', content='...', tags=['Vegano'])
+
+    def test_filter_any_and_all(self):
+        """Test filtros por uno o todos los tags."""
+        published = BlogPost.objects.filter(status='published')
+        self.assertEqual(set(published.with_tags(['vegano', 'INVIERNO'])), {self.vegan, self.soup})
+        self.assertEqual(list(published.with_tags(['vegano', 'invierno'], match='all')), [self.vegan])
+
+        response = self.client.get('/api/website/blog/', {'tag': 'invierno,vegano', 'tag_match': 'all'})
+        self.assertEqual([p['id'] for p in response.json()['results']], [self.vegan.id])
+
+    def test_index_follows_tag_changes(self):
+        """Test al quitar un tag se elimina su relación."""
+        self.vegan.tags = ['Vegano']
+        self.vegan.save()
+
+        self.assertEqual(list(BlogPost.objects.with_tags(['invierno'])), [self.soup])
+
+    def test_tag_cloud(self):
+        """Test nube de tags con conteo de posts publicados."""
+        response = self.client.get('/api/website/blog/tags/')
+
+        self.assertEqual(response.json(), [
+            {'name': 'Invierno', 'slug': 'invierno', 'post_count': 2},
+            {'name': 'Vegano', 'slug': 'vegano', 'post_count': 1},
+        ])
@@ -59,6 +59,12 @@ if [ "$1" = "worker" ]; then
 elif [ "$1" = "beat" ]; then
     echo "Iniciando Celery Beat..."
     exec celery -A operations_service beat -l info
+elif [ "$1" = "pos-consumer" ]; then
+    echo "Iniciando consumidor de eventos POS..."
+    exec python manage.py consume_pos_events
+elif [ "$1" = "outbox-relay" ]; then
+    echo "Iniciando relay del outbox de eventos..."
+    exec python manage.py relay_outbox
 else
     echo "Iniciando servidor Gunicorn..."
     exec gunicorn operations_service.wsgi:application --bind 0.0.0.0:8000 --workers 3 --timeout 120
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Category, UnitOfMeasure, Product, PurchaseUnit, Purchase, PurchaseItem
+from .models import Category, UnitOfMeasure, Product, PurchaseUnit, Purchase, PurchaseItem, ProcessedOrder, OutboxEvent, StockMovement, StockSnapshot
 
 
 @admin.register(Category)
@@ -50,3 +50,33 @@ class PurchaseItemAdmin(admin.ModelAdmin):
     list_filter = ['purchase__purchase_date', 'product__category']
     search_fields = ['product__name', 'purchase__document_number']
     readonly_fields = ['calculated_net_cost_per_base_unit', 'created_at', 'updated_at']
+
+
+@admin.register(ProcessedOrder)
+class ProcessedOrderAdmin(admin.ModelAdmin):
+    list_display = ['order_id', 'items_count', 'processed_at']
+    search_fields = ['order_id']
+    readonly_fields = ['order_id', 'items_count', 'processed_at']
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ['id', 'event_type', 'aggregate_type', 'aggregate_id', 'attempts', 'created_at', 'published_at']
+    list_filter = ['event_type', 'aggregate_type']
+    search_fields = ['aggregate_id']
+    readonly_fields = ['aggregate_type', 'aggregate_id', 'event_type', 'routing_key', 'payload', 'attempts', 'created_at', 'published_at']
+
+
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    list_display = ['product', 'movement_type', 'quantity', 'reference', 'created_at']
+    list_filter = ['movement_type', 'product__category']
+    search_fields = ['product__name', 'reference', 'notes']
+    readonly_fields = ['product', 'movement_type', 'quantity', 'reference', 'notes', 'created_at']
+
+
+@admin.register(StockSnapshot)
+class StockSnapshotAdmin(admin.ModelAdmin):
+    list_display = ['product', 'stock', 'last_movement_id', 'taken_at']
+    search_fields = ['product__name']
+    date_hierarchy = 'taken_at'
@@ -0,0 +1,255 @@
+"""
+Importación de facturas de proveedores desde archivos CSV o XLSX.
+
+Los archivos se leen fila por fila, sin cargarlos completos en memoria.
+Productos y unidades de compra se resuelven con diccionarios en memoria,
+las filas se validan en bloques y las válidas se insertan con
+Purchase.add_items; las inválidas se informan con su número de fila.
+"""
+
+import csv
+import io
+import os
+import zipfile
+from decimal import Decimal, InvalidOperation
+
+from .models import Product, PurchaseUnit
+
+# Encabezados aceptados para cada columna (en minúsculas)
+COLUMN_ALIASES = {
+    'product': ('product', 'producto'),
+    'purchase_unit': ('purchase_unit', 'unidad', 'unidad_compra'),
+    'quantity_purchased': ('quantity_purchased', 'quantity', 'cantidad'),
+    'total_cost': ('total_cost', 'costo_total', 'total'),
+    'notes': ('notes', 'notas'),
+}
+REQUIRED_COLUMNS = ('product', 'purchase_unit', 'quantity_purchased', 'total_cost')
+# Máximo de errores por fila incluidos en el resultado
+MAX_REPORTED_ERRORS = 1000
+
+
+class InvoiceImportError(Exception):
+    """Error que impide procesar el archivo completo (formato o encabezados)."""
+
+
+def _normalize_header(header):
+    columns = {}
+    for index, name in enumerate(header):
+        name = str(name or '').strip().lower()
+        for column, aliases in COLUMN_ALIASES.items():
+            if name in aliases and column not in columns:
+                columns[column] = index
+    missing = [column for column in REQUIRED_COLUMNS if column not in columns]
+    if missing:
+        raise InvoiceImportError(f"Faltan columnas requeridas: {', '.join(missing)}")
+    return columns
+
+
+def _iter_csv(file):
+    text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+    try:
+        yield from csv.reader(text)
+    except UnicodeDecodeError:
+        raise InvoiceImportError('El archivo CSV debe estar codificado en UTF-8')
+    except csv.Error as exc:
+        raise InvoiceImportError(f'El archivo CSV no es válido: {exc}')
+    finally:
+        # Evitar que el wrapper cierre el archivo subido
+        text.detach()
+
+
+def _iter_xlsx(file):
+    try:
+        from openpyxl import load_workbook
+        from openpyxl.utils.exceptions import InvalidFileException
+    except ImportError:
+        raise InvoiceImportError('La importación de XLSX requiere el paquete openpyxl')
+
+    try:
+        workbook = load_workbook(file, read_only=True, data_only=True)
+    except (zipfile.BadZipFile, InvalidFileException):
+        raise InvoiceImportError('El archivo XLSX está dañado o no es un libro de Excel válido')
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    except zipfile.BadZipFile:
+        raise InvoiceImportError('El archivo XLSX está dañado o no es un libro de Excel válido')
+    finally:
+        workbook.close()
+
+
+def iter_invoice_rows(file, filename):
+    """
+    Recorre las filas de un archivo CSV o XLSX.
+
+    Args:
+        file: Archivo binario abierto
+        filename: Nombre del archivo, usado para detectar el formato
+
+    Yields:
+        tuple: (número de fila, dict columna -> valor) desde la fila 2
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == '.csv':
+        rows = _iter_csv(file)
+    elif extension == '.xlsx':
+        rows = _iter_xlsx(file)
+    else:
+        raise InvoiceImportError('Formato no soportado: use un archivo .csv o .xlsx')
+
+    header = next(rows, None)
+    if header is None:
+        raise InvoiceImportError('El archivo está vacío')
+    columns = _normalize_header(header)
+
+    for row_number, row in enumerate(rows, start=2):
+        if not any(value not in (None, '') for value in row):
+            continue
+        yield row_number, {
+            column: row[index] if index < len(row) else None
+            for column, index in columns.items()
+        }
+
+
+def _parse_decimal(value):
+    if isinstance(value, (int, float, Decimal)):
+        return Decimal(str(value))
+    return Decimal(str(value or '').strip().replace(',', '.'))
+
+
+class InvoiceImporter:
+    """
+    Valida e importa las filas de una factura de proveedor.
+
+    Uso:
+        importer = InvoiceImporter()
+        with transaction.atomic():
+            purchase = Purchase.objects.create(...)
+            created = purchase.add_items(importer.iter_items(iter_invoice_rows(file, name)))
+        importer.errors  # [{'row': 5, 'errors': {...}}]
+    """
+
+    def __init__(self, chunk_size=500):
+        self.chunk_size = chunk_size
+        self.errors = []
+        self.error_count = 0
+        self.valid_count = 0
+
+        # Búsqueda por id o por nombre (sin distinguir mayúsculas)
+        self.products = {}
+        for product in Product.objects.filter(is_active=True).only('id', 'name', 'average_cost'):
+            self.products[str(product.id)] = product
+            self.products[product.name.strip().lower()] = product
+        self.units = {}
+        for unit in PurchaseUnit.objects.only('id', 'name', 'conversion_factor'):
+            self.units[str(unit.id)] = unit
+            self.units[unit.name.strip().lower()] = unit
+
+    def _lookup(self, table, value):
+        key = str(value or '').strip()
+        if key.endswith('.0') and key[:-2].isdigit():
+            # Celdas numéricas de XLSX (ej: 12.0)
+            key = key[:-2]
+        return table.get(key) or table.get(key.lower())
+
+    def validate_row(self, values):
+        """
+        Valida una fila.
+
+        Returns:
+            tuple: (datos del ítem o None, dict de errores por columna)
+        """
+        errors = {}
+
+        product = self._lookup(self.products, values.get('product'))
+        if product is None:
+            errors['product'] = f"Producto no encontrado: {values.get('product')!r}"
+
+        unit = self._lookup(self.units, values.get('purchase_unit'))
+        if unit is None:
+            errors['purchase_unit'] = f"Unidad de compra no encontrada: {values.get('purchase_unit')!r}"
+
+        amounts = {}
+        for column, minimum in (('quantity_purchased', Decimal('0.001')), ('total_cost', Decimal('0'))):
+            try:
+                amount = _parse_decimal(values.get(column))
+            except (InvalidOperation, ValueError):
+                errors[column] = f'Número inválido: {values.get(column)!r}'
+                continue
+            if not amount.is_finite() or amount < minimum:
+                errors[column] = f'Debe ser mayor o igual a {minimum}'
+            else:
+                amounts[column] = amount
+
+        if errors:
+            return None, errors
+        return {
+            'product': product,
+            'purchase_unit': unit,
+            'quantity_purchased': amounts['quantity_purchased'],
+            'total_cost': amounts['total_cost'],
+            'notes': str(values.get('notes') or '').strip(),
+        }, errors
+
+    def _validate_chunk(self, chunk):
+        for row_number, values in chunk:
+            item, errors = self.validate_row(values)
+            if item is None:
+                self.error_count += 1
+                if len(self.errors) < MAX_REPORTED_ERRORS:
+                    self.errors.append({'row': row_number, 'errors': errors})
+                continue
+            self.valid_count += 1
+            yield item
+
+    def iter_items(self, rows):
+        """
+        Valida las filas en bloques de `chunk_size` y entrega los ítems válidos.
+
+        Args:
+            rows: Iterable de (número de fila, valores), ver iter_invoice_rows
+        """
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= self.chunk_size:
+                yield from self._validate_chunk(chunk)
+                chunk = []
+        yield from self._validate_chunk(chunk)
+
+    def summary(self):
+        """Resumen de la importación para la API y el comando."""
+        return {
+            'imported_rows': self.valid_count,
+            'error_count': self.error_count,
+            'errors': self.errors,
+        }
+
+
+def import_invoice(file, filename, purchase_data, chunk_size=500, batch_size=1000):
+    """
+    Crea una compra con los ítems válidos de un archivo de factura.
+
+    Si ninguna fila es válida no se crea la compra.
+
+    Args:
+        file: Archivo binario abierto (CSV o XLSX)
+        filename: Nombre del archivo
+        purchase_data: Campos de la compra (supplier, purchase_date, document_type, ...)
+        chunk_size: Filas validadas por bloque
+        batch_size: Ítems por cada bulk_create
+
+    Returns:
+        tuple: (Purchase o None, resumen de la importación)
+    """
+    from django.db import transaction
+    from .models import Purchase
+
+    importer = InvoiceImporter(chunk_size=chunk_size)
+    rows = iter_invoice_rows(file, filename)
+    with transaction.atomic():
+        purchase = Purchase.objects.create(**purchase_data)
+        created = purchase.add_items(importer.iter_items(rows), batch_size=batch_size)
+        if not created:
+            transaction.set_rollback(True)
+            purchase = None
+    return purchase, importer.summary()
@@ -0,0 +1,151 @@
+"""
+Comando para consumir eventos order.paid del POS en micro-lotes.
+Uso: python manage.py consume_pos_events [--prefetch 50] [--batch-size 25] [--batch-timeout-ms 200]
+
+Reemplaza el camino listen_pos_events -> process_order_paid.delay():
+los mensajes se aplican directamente en una sola transacción por lote
+y se confirman (ack) juntos, sin volver a pasar por el broker.
+"""
+
+import logging
+import socket
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import InterfaceError, OperationalError, close_old_connections, transaction
+from kombu import Connection
+
+from inventory.tasks import POS_ORDERS_QUEUE, apply_paid_orders
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Consume eventos order.paid del POS aplicándolos en micro-lotes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--prefetch',
+            type=int,
+            default=settings.POS_CONSUMER_PREFETCH,
+            help='Mensajes sin confirmar que el broker puede entregar (QoS prefetch_count)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.POS_CONSUMER_BATCH_SIZE,
+            help='Máximo de órdenes por lote'
+        )
+        parser.add_argument(
+            '--batch-timeout-ms',
+            type=int,
+            default=settings.POS_CONSUMER_BATCH_TIMEOUT_MS,
+            help='Tiempo máximo de espera desde el primer mensaje antes de aplicar el lote'
+        )
+
+    def handle(self, *args, **options):
+        self.batch_size = max(options['batch_size'], 1)
+        self.batch_timeout = options['batch_timeout_ms'] / 1000
+        # Con un prefetch menor al lote nunca se llenaría un lote completo
+        prefetch = max(options['prefetch'], self.batch_size)
+
+        self.buffer = []
+        self.deadline = None
+
+        with Connection(settings.EVENT_BUS_URL) as conn:
+            consumer = conn.Consumer(
+                POS_ORDERS_QUEUE,
+                callbacks=[self.on_message],
+                prefetch_count=prefetch,
+            )
+            with consumer:
+                self.stdout.write(self.style.SUCCESS(
+                    f'Consumidor POS iniciado (prefetch={prefetch}, '
+                    f'lote={self.batch_size}, espera={options["batch_timeout_ms"]}ms)'
+                ))
+                while True:
+                    self.drain(conn)
+                    if self.batch_ready():
+                        self.flush()
+
+    def on_message(self, body, message):
+        """Acumula el mensaje en el lote actual."""
+        if not isinstance(body, dict):
+            logger.error(f"Evento POS inválido, se descarta: {body!r}")
+            message.reject()
+            return
+
+        if not self.buffer:
+            self.deadline = time.monotonic() + self.batch_timeout
+        self.buffer.append((body, message))
+
+    def drain(self, conn):
+        """Espera mensajes hasta que venza el plazo del lote en curso."""
+        if self.buffer:
+            timeout = self.deadline - time.monotonic()
+            if timeout <= 0:
+                return
+        else:
+            timeout = 1
+
+        try:
+            conn.drain_events(timeout=timeout)
+        except socket.timeout:
+            pass
+
+    def batch_ready(self):
+        if not self.buffer:
+            return False
+        return len(self.buffer) >= self.batch_size or time.monotonic() >= self.deadline
+
+    def flush(self):
+        """Aplica el lote en una sola transacción y lo confirma en bloque."""
+        batch, self.buffer = self.buffer, []
+        self.deadline = None
+        messages = [message for _, message in batch]
+
+        close_old_connections()
+        try:
+            with transaction.atomic():
+                applied_order_ids, _ = apply_paid_orders([body for body, _ in batch])
+        except Exception as exc:
+            logger.error(f"Error aplicando lote de {len(batch)} órdenes, se aplican una a una: {exc}")
+            self.flush_one_by_one(batch)
+            return
+
+        # Un único basic.ack confirma todos los mensajes del lote
+        messages[-1].ack(multiple=True)
+
+        logger.info(f"Lote aplicado: {len(applied_order_ids)} de {len(batch)} órdenes")
+
+    def flush_one_by_one(self, batch):
+        """
+        Aplica cada orden del lote fallido en su propia transacción.
+
+        Las órdenes aplicadas se confirman; las que vuelven a fallar se
+        rechazan sin reencolar, para que un mensaje inválido no bloquee el
+        consumo. Con una política de dead-letter en la cola, el broker las
+        deriva a la cola de mensajes muertos. Los errores de conexión a la
+        base de datos reencolan los mensajes restantes.
+        """
+        applied = 0
+        for index, (body, message) in enumerate(batch):
+            try:
+                with transaction.atomic():
+                    applied_order_ids, _ = apply_paid_orders([body])
+            except (OperationalError, InterfaceError) as exc:
+                # Falla de conexión: no es culpa del mensaje, se reintenta el resto
+                logger.error(f"Error de base de datos aplicando órdenes, se reencolan: {exc}")
+                for _, pending in batch[index:]:
+                    pending.requeue()
+                return
+            except Exception as exc:
+                logger.error(f"Orden {body.get('order_id')!r} rechazada: {exc}; payload: {body!r}")
+                message.reject()
+                continue
+            # El ledger de órdenes hace seguro aplicar de nuevo una orden ya procesada
+            applied += len(applied_order_ids)
+            message.ack()
+
+        logger.info(f"Lote aplicado orden a orden: {applied} de {len(batch)} órdenes")
@@ -0,0 +1,93 @@
+"""
+Comando para importar una factura de proveedor desde un archivo CSV o XLSX.
+Uso: python manage.py import_purchase_invoice factura.csv --supplier 3 --date 2024-01-31
+        --document-type FACTURA --document-number 12345
+
+El archivo se lee fila por fila (ver inventory.importers), por lo que
+admite miles de filas sin cargarlo completo en memoria.
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from inventory.importers import InvoiceImportError, import_invoice
+from inventory.models import Purchase
+from suppliers.models import Supplier
+
+
+class Command(BaseCommand):
+    help = 'Importa una factura de proveedor desde un archivo CSV o XLSX'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Ruta del archivo .csv o .xlsx')
+        parser.add_argument('--supplier', type=int, required=True, help='ID del proveedor')
+        parser.add_argument('--date', required=True, help='Fecha de compra (YYYY-MM-DD)')
+        parser.add_argument(
+            '--document-type',
+            default='FACTURA',
+            choices=[choice for choice, _ in Purchase.DOCUMENT_TYPES],
+            help='Tipo de documento'
+        )
+        parser.add_argument('--document-number', required=True, help='Número de documento')
+        parser.add_argument('--notes', default='', help='Notas de la compra')
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=settings.PURCHASE_IMPORT_CHUNK_SIZE,
+            help='Filas validadas por bloque'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.PURCHASE_IMPORT_BATCH_SIZE,
+            help='Ítems por cada bulk_create'
+        )
+
+    def handle(self, *args, **options):
+        purchase_date = parse_date(options['date'])
+        if purchase_date is None:
+            raise CommandError('--date debe tener el formato YYYY-MM-DD')
+
+        try:
+            supplier = Supplier.objects.get(pk=options['supplier'])
+        except Supplier.DoesNotExist:
+            raise CommandError(f"Proveedor {options['supplier']} no encontrado")
+
+        if Purchase.objects.filter(
+            document_type=options['document_type'],
+            document_number=options['document_number']
+        ).exists():
+            raise CommandError('Ya existe una compra con ese tipo y número de documento')
+
+        try:
+            with open(options['path'], 'rb') as file:
+                purchase, summary = import_invoice(
+                    file,
+                    options['path'],
+                    {
+                        'supplier': supplier,
+                        'purchase_date': purchase_date,
+                        'document_type': options['document_type'],
+                        'document_number': options['document_number'],
+                        'notes': options['notes'],
+                    },
+                    chunk_size=max(options['chunk_size'], 1),
+                    batch_size=max(options['batch_size'], 1),
+                )
+        except (OSError, InvoiceImportError) as exc:
+            raise CommandError(str(exc))
+
+        for error in summary['errors']:
+            messages = '; '.join(f'{column}: {message}' for column, message in error['errors'].items())
+            self.stderr.write(f"Fila {error['row']}: {messages}")
+        if summary['error_count'] > len(summary['errors']):
+            self.stderr.write(f"... y {summary['error_count'] - len(summary['errors'])} filas inválidas más")
+
+        if purchase is None:
+            raise CommandError('El archivo no tiene filas válidas; no se creó la compra')
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Compra #{purchase.id} creada con {summary['imported_rows']} ítems "
+            f"(total {purchase.total_amount}, {summary['error_count']} filas con errores)"
+        ))
@@ -0,0 +1,46 @@
+"""
+Comando para publicar en el bus los eventos del outbox.
+Uso: python manage.py relay_outbox [--batch-size 500] [--interval-ms 500]
+
+Proceso de larga duración: vacía el outbox en lotes y, cuando no quedan
+eventos pendientes, espera el intervalo configurado antes de volver a revisar.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from inventory.tasks import drain_outbox
+
+
+class Command(BaseCommand):
+    help = 'Publica continuamente los eventos pendientes del outbox en el exchange operations_events'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.OUTBOX_RELAY_BATCH_SIZE,
+            help='Máximo de eventos publicados por lote'
+        )
+        parser.add_argument(
+            '--interval-ms',
+            type=int,
+            default=settings.OUTBOX_RELAY_INTERVAL_MS,
+            help='Espera entre revisiones cuando el outbox está vacío'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(options['batch_size'], 1)
+        interval = options['interval_ms'] / 1000
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Relay del outbox iniciado (lote={batch_size}, intervalo={options["interval_ms"]}ms)'
+        ))
+        while True:
+            close_old_connections()
+            published = drain_outbox(batch_size)
+            if published < batch_size:
+                time.sleep(interval)
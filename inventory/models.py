@@ -4,9 +4,18 @@ Gestiona categorías, unidades de medida, productos, compras y stock.
 """
 
 from django.db import models
+from django.db.models import Case, When, Value, F, Q
+from django.db.models.functions import Greatest
+from django.db.models.lookups import LessThanOrEqual
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone
 from decimal import Decimal
-from django.db import transaction
+from django.db import transaction, IntegrityError
+
+
+def _as_decimal(value):
+    """Convierte cantidades (int, float, str) a Decimal sin errores de redondeo."""
+    return value if isinstance(value, Decimal) else Decimal(str(value))
 
 
 class Category(models.Model):
@@ -41,6 +50,166 @@ class UnitOfMeasure(models.Model):
         return f"{self.name} ({self.abbreviation})"
 
 
+def _low_stock_expression(stock):
+    """Expresión SQL que indica si `stock` está en o bajo el umbral del producto."""
+    # Con umbral NULL la comparación es NULL y cae en el default (False)
+    return Case(
+        When(LessThanOrEqual(stock, F('low_stock_threshold')), then=Value(True)),
+        default=Value(False),
+        output_field=models.BooleanField(),
+    )
+
+
+# Evento a emitir según el nuevo estado de low_stock
+LOW_STOCK_EVENTS = {
+    True: ('PRODUCT_LOW_STOCK', 'product.stock.low'),
+    False: ('PRODUCT_STOCK_RECOVERED', 'product.stock.recovered'),
+}
+
+
+class ProductQuerySet(models.QuerySet):
+    """QuerySet de productos con operaciones atómicas de stock."""
+
+    def low_stock(self):
+        """Productos con stock bajo, según la columna indexada low_stock."""
+        return self.filter(low_stock=True)
+
+    def sync_low_stock(self):
+        """
+        Recalcula la columna low_stock con un único UPDATE.
+        
+        Solo escribe las filas cuyo valor cambió; sirve para poblar la
+        columna tras crearla y como verificación periódica.
+        
+        Returns:
+            int: Cantidad de productos corregidos
+        """
+        below = Q(low_stock_threshold__isnull=False, current_stock__lte=F('low_stock_threshold'))
+        return (
+            self.filter(below, low_stock=False).update(low_stock=True)
+            + self.filter(~below, low_stock=True).update(low_stock=False)
+        )
+
+    def apply_stock_changes(self, changes, purchases=None):
+        """
+        Aplica cambios de stock a varios productos con un único UPDATE.
+        
+        El nuevo stock se calcula en la base de datos como
+        GREATEST(current_stock + cambio, 0), sin leer la fila ni bloquearla
+        previamente, y solo se escriben las columnas afectadas.
+        
+        Args:
+            changes: Dict {product_id: cambio de stock} (positivo compra, negativo venta)
+            purchases: Dict opcional {product_id: (costo_neto, cantidad_en_base)}
+                para recalcular el costo promedio ponderado de compras
+        
+        Returns:
+            int: Cantidad de productos actualizados
+        """
+        if not changes:
+            return 0
+        
+        changes = {pk: _as_decimal(quantity) for pk, quantity in changes.items()}
+        purchases = {
+            pk: (_as_decimal(cost), _as_decimal(quantity))
+            for pk, (cost, quantity) in (purchases or {}).items()
+        }
+        
+        stock_field = models.DecimalField(max_digits=12, decimal_places=3)
+        cost_field = models.DecimalField(max_digits=12, decimal_places=2)
+        
+        if len(changes) == 1:
+            delta = Value(next(iter(changes.values())), output_field=stock_field)
+        else:
+            delta = Case(
+                *[
+                    When(pk=product_id, then=Value(quantity))
+                    for product_id, quantity in changes.items()
+                ],
+                default=Value(Decimal('0')),
+                output_field=stock_field,
+            )
+        
+        new_stock = Greatest(
+            F('current_stock') + delta,
+            Value(Decimal('0')),
+            output_field=stock_field,
+        )
+        
+        # En MySQL las asignaciones de un UPDATE se evalúan de izquierda a
+        # derecha y ven los valores ya asignados: average_cost y low_stock
+        # deben ir antes que current_stock para partir del stock previo.
+        updates = {}
+        if purchases:
+            updates['average_cost'] = Case(
+                *[
+                    When(
+                        Q(pk=product_id) & Q(current_stock__gt=-quantity),
+                        then=(
+                            (F('current_stock') * F('average_cost') + Value(cost))
+                            / (F('current_stock') + Value(quantity))
+                        ),
+                    )
+                    for product_id, (cost, quantity) in purchases.items()
+                ],
+                default=F('average_cost'),
+                output_field=cost_field,
+            )
+        updates['low_stock'] = _low_stock_expression(new_stock)
+        updates['current_stock'] = new_stock
+        updates['updated_at'] = timezone.now()
+        
+        updated = self.filter(pk__in=changes.keys()).update(**updates)
+        if updated:
+            self.model.objects.filter(pk__in=changes.keys()).emit_low_stock_transitions()
+        return updated
+
+    def emit_low_stock_transitions(self):
+        """
+        Registra en el outbox los cruces del umbral de stock bajo.
+        
+        low_stock_alerted guarda el último estado notificado de cada
+        producto; solo las filas donde difiere de low_stock cruzaron el
+        umbral. Cada cruce se confirma con un UPDATE condicional por
+        producto, de modo que si dos transacciones lo detectan a la vez solo
+        una emite PRODUCT_LOW_STOCK o PRODUCT_STOCK_RECOVERED.
+        
+        Returns:
+            list: Eventos del outbox registrados
+        """
+        candidates = self.exclude(low_stock=F('low_stock_alerted')).values_list(
+            'pk', 'name', 'low_stock', 'current_stock', 'low_stock_threshold'
+        )
+        
+        events = []
+        for product_id, name, low_stock, current_stock, threshold in candidates:
+            claimed = Product.objects.filter(
+                pk=product_id,
+                low_stock=low_stock,
+                low_stock_alerted=not low_stock
+            ).update(low_stock_alerted=low_stock)
+            if not claimed:
+                continue
+            
+            event_type, routing_key = LOW_STOCK_EVENTS[low_stock]
+            events.append(OutboxEvent.build(
+                event_type=event_type,
+                routing_key=routing_key,
+                aggregate_type='product',
+                aggregate_id=product_id,
+                payload={
+                    'product_id': product_id,
+                    'product_name': name,
+                    'current_stock': float(current_stock),
+                    'threshold': float(threshold) if threshold is not None else None,
+                }
+            ))
+        
+        if events:
+            OutboxEvent.objects.bulk_create(events)
+        return events
+
+
 class Product(models.Model):
     """Producto en inventario."""
     name = models.CharField(max_length=200, unique=True, verbose_name="Nombre")
@@ -82,6 +251,19 @@ class Product(models.Model):
         verbose_name="Umbral de Stock Bajo",
         help_text="Alerta cuando el stock sea menor a este valor"
     )
+    # Materializa is_low_stock para filtrar en la base; se actualiza en el
+    # mismo UPDATE que modifica el stock (ver ProductQuerySet.apply_stock_changes)
+    low_stock = models.BooleanField(
+        default=False,
+        editable=False,
+        verbose_name="Stock Bajo"
+    )
+    # Último estado de stock bajo notificado (ver emit_low_stock_transitions)
+    low_stock_alerted = models.BooleanField(
+        default=False,
+        editable=False,
+        verbose_name="Alerta de Stock Bajo Emitida"
+    )
     waste_percentage = models.DecimalField(
         max_digits=5,
         decimal_places=2,
@@ -134,6 +316,8 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ProductQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Producto"
         verbose_name_plural = "Productos"
@@ -141,11 +325,26 @@ class Product(models.Model):
         indexes = [
             models.Index(fields=['category', 'name']),
             models.Index(fields=['is_active']),
+            models.Index(fields=['is_active', 'low_stock']),
         ]
 
     def __str__(self):
         return f"{self.name} ({self.current_stock} {self.inventory_unit.abbreviation})"
 
+    def save(self, *args, **kwargs):
+        is_new = self._state.adding
+        self.low_stock = self.is_low_stock
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'current_stock', 'low_stock_threshold'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'low_stock'}
+        super().save(*args, **kwargs)
+        if is_new:
+            # Saldo inicial: base de stock_as_of para el stock con que se crea
+            StockSnapshot.objects.create(product=self, stock=self.current_stock)
+        if self.low_stock != self.low_stock_alerted:
+            Product.objects.filter(pk=self.pk).emit_low_stock_transitions()
+            self.refresh_from_db(fields=['low_stock_alerted'])
+
     @property
     def is_low_stock(self):
         """Indica si el producto tiene stock bajo."""
@@ -163,31 +362,163 @@ class Product(models.Model):
             return self.image.url
         return None
 
-    def update_stock_and_cost(self, quantity_change, new_item_cost=None, new_quantity_in_base=None):
+    def update_stock_and_cost(self, quantity_change, new_item_cost=None, new_quantity_in_base=None,
+                              movement_type=None, reference='', notes=''):
         """
         Actualiza el stock y recalcula el costo promedio.
         
+        El cambio se aplica con un UPDATE atómico (ver
+        ProductQuerySet.apply_stock_changes), por lo que no requiere que el
+        llamador bloquee la fila. Luego recarga los valores resultantes.
+        
         Args:
             quantity_change: Cambio en la cantidad (positivo para compra, negativo para venta)
             new_item_cost: Costo total del nuevo ítem (para compras)
             new_quantity_in_base: Cantidad en unidades base del nuevo ítem
+            movement_type: Tipo de movimiento a registrar en el ledger (StockMovement)
+            reference: Referencia del movimiento (ej: 'purchase_item:15')
+            notes: Notas del movimiento
         """
+        purchases = None
+        if quantity_change > 0 and new_item_cost is not None and new_quantity_in_base is not None:
+            # Compra: recalcular costo promedio ponderado
+            purchases = {self.pk: (new_item_cost, new_quantity_in_base)}
+        
         with transaction.atomic():
-            if quantity_change > 0 and new_item_cost is not None and new_quantity_in_base is not None:
-                # Compra: recalcular costo promedio ponderado
-                current_total_value = self.current_stock * self.average_cost
-                new_total_value = current_total_value + new_item_cost
-                new_total_stock = self.current_stock + new_quantity_in_base
-                
-                if new_total_stock > 0:
-                    self.average_cost = new_total_value / new_total_stock
-            
-            # Actualizar stock
-            self.current_stock += quantity_change
-            if self.current_stock < 0:
-                self.current_stock = Decimal('0')
-            
-            self.save()
+            Product.objects.filter(pk=self.pk).apply_stock_changes(
+                {self.pk: quantity_change},
+                purchases=purchases
+            )
+            if movement_type:
+                StockMovement.record(
+                    {self.pk: quantity_change},
+                    movement_type,
+                    reference=reference,
+                    notes=notes
+                )
+        self.refresh_from_db(fields=['current_stock', 'average_cost', 'low_stock', 'low_stock_alerted', 'updated_at'])
+
+    def stock_as_of(self, moment):
+        """
+        Calcula el stock del producto en una fecha dada.
+        
+        Parte de la última foto (StockSnapshot) anterior a `moment` y suma
+        solo los movimientos posteriores a ella, en lugar de recorrer todo
+        el historial.
+        """
+        snapshot = self.stock_snapshots.filter(taken_at__lte=moment).order_by('-taken_at').first()
+        base_stock = snapshot.stock if snapshot else Decimal('0')
+        last_movement_id = snapshot.last_movement_id if snapshot else 0
+        
+        delta = self.stock_movements.filter(
+            id__gt=last_movement_id,
+            created_at__lte=moment
+        ).aggregate(total=models.Sum('quantity'))['total'] or Decimal('0')
+        
+        return max(base_stock + delta, Decimal('0'))
+
+
+class StockMovement(models.Model):
+    """
+    Movimiento de stock (ledger de solo inserción).
+    Registra compras, ventas, ajustes manuales y mermas.
+    """
+    MOVEMENT_TYPES = [
+        ('PURCHASE', 'Compra'),
+        ('SALE', 'Venta'),
+        ('ADJUSTMENT', 'Ajuste'),
+        ('WASTE', 'Merma'),
+    ]
+
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.PROTECT,
+        related_name='stock_movements',
+        verbose_name="Producto"
+    )
+    movement_type = models.CharField(
+        max_length=20,
+        choices=MOVEMENT_TYPES,
+        verbose_name="Tipo de Movimiento"
+    )
+    quantity = models.DecimalField(
+        max_digits=12,
+        decimal_places=3,
+        verbose_name="Cantidad",
+        help_text="Cambio en unidades base (positivo entrada, negativo salida)"
+    )
+    reference = models.CharField(
+        max_length=100,
+        blank=True,
+        verbose_name="Referencia",
+        help_text="Origen del movimiento (ej: order:123, purchase_item:45)"
+    )
+    notes = models.CharField(max_length=300, blank=True, verbose_name="Notas")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Movimiento de Stock"
+        verbose_name_plural = "Movimientos de Stock"
+        ordering = ['-id']
+        indexes = [
+            models.Index(fields=['product', '-id']),
+            models.Index(fields=['product', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_movement_type_display()} {self.quantity} - {self.product_id}"
+
+    @classmethod
+    def record(cls, changes, movement_type, reference='', notes=''):
+        """
+        Registra movimientos con un solo bulk_create.
+        
+        Args:
+            changes: Dict {product_id: cantidad} o lista de tuplas (product_id, cantidad)
+            movement_type: Tipo de movimiento (PURCHASE, SALE, ADJUSTMENT, WASTE)
+        """
+        items = changes.items() if isinstance(changes, dict) else changes
+        return cls.objects.bulk_create([
+            cls(
+                product_id=product_id,
+                movement_type=movement_type,
+                quantity=_as_decimal(quantity),
+                reference=str(reference),
+                notes=notes,
+            )
+            for product_id, quantity in items
+        ])
+
+
+class StockSnapshot(models.Model):
+    """
+    Foto periódica del stock de un producto.
+    Permite calcular el stock a una fecha sumando solo los movimientos posteriores.
+    """
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='stock_snapshots',
+        verbose_name="Producto"
+    )
+    stock = models.DecimalField(max_digits=12, decimal_places=3, verbose_name="Stock")
+    last_movement_id = models.BigIntegerField(
+        default=0,
+        verbose_name="Último Movimiento",
+        help_text="ID del último StockMovement incluido en la foto"
+    )
+    taken_at = models.DateTimeField(default=timezone.now, verbose_name="Tomada el")
+
+    class Meta:
+        verbose_name = "Foto de Stock"
+        verbose_name_plural = "Fotos de Stock"
+        ordering = ['-taken_at']
+        indexes = [
+            models.Index(fields=['product', '-taken_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}: {self.stock} @ {self.taken_at}"
 
 
 class PurchaseUnit(models.Model):
@@ -271,6 +602,96 @@ class Purchase(models.Model):
         self.save(update_fields=['total_amount'])
         return total
 
+    def add_items(self, items_data, batch_size=1000):
+        """
+        Agrega varios ítems a la compra en bloque, en una transacción.
+        
+        Los costos netos se calculan en memoria y los ítems se insertan con
+        bulk_create en lotes de `batch_size`, por lo que `items_data` puede
+        ser un generador de cualquier largo (ver inventory.importers). El
+        stock y costo promedio de todos los productos se actualizan al final
+        con un único UPDATE (ver ProductQuerySet.apply_stock_changes). Registra
+        un movimiento de ledger por producto, un único evento
+        PRODUCT_STOCK_BATCH_UPDATED y actualiza el total sin volver a leer
+        los ítems.
+        
+        Args:
+            items_data: Iterable de dicts con product y purchase_unit (instancias
+                ya cargadas), quantity_purchased, total_cost y notes opcional
+            batch_size: Ítems por cada bulk_create
+        
+        Returns:
+            int: Cantidad de ítems creados (los ítems no se retienen en memoria)
+        """
+        with transaction.atomic():
+            return self._add_items(items_data, batch_size)
+
+    def _add_items(self, items_data, batch_size):
+        from inventory.tasks import stock_event_payload
+        
+        created = 0
+        total = Decimal('0')
+        changes = {}
+        purchases = {}
+        previous_costs = {}
+        batch = []
+        for data in items_data:
+            item = PurchaseItem(purchase=self, **data)
+            quantity, net_cost = item.compute_net_cost()
+            batch.append(item)
+            total += item.total_cost
+            
+            product_id = item.product.id
+            previous_costs.setdefault(product_id, item.product.average_cost)
+            changes[product_id] = changes.get(product_id, Decimal('0')) + quantity
+            cost, total_quantity = purchases.get(product_id, (Decimal('0'), Decimal('0')))
+            purchases[product_id] = (cost + net_cost, total_quantity + quantity)
+            
+            if len(batch) >= batch_size:
+                PurchaseItem.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        
+        if batch:
+            PurchaseItem.objects.bulk_create(batch)
+            created += len(batch)
+        if not created:
+            return 0
+        
+        Product.objects.apply_stock_changes(changes, purchases=purchases)
+        StockMovement.record(changes, 'PURCHASE', reference=f'purchase:{self.pk}')
+        
+        products = list(
+            Product.objects.filter(id__in=changes.keys())
+            .only('id', 'current_stock', 'average_cost')
+            .order_by('id')
+        )
+        OutboxEvent.enqueue(
+            event_type='PRODUCT_STOCK_BATCH_UPDATED',
+            routing_key='product.stock.batch_updated',
+            aggregate_type='purchase',
+            aggregate_id=self.pk,
+            payload={
+                'order_ids': [],
+                'purchase_id': self.pk,
+                'products': stock_event_payload(products),
+            }
+        )
+        
+        self.total_amount += total
+        self.save(update_fields=['total_amount', 'updated_at'])
+        
+        # Recalcular solo las recetas de productos cuyo costo cambió
+        changed_cost_ids = [
+            product.id for product in products
+            if product.average_cost != previous_costs[product.id]
+        ]
+        if changed_cost_ids:
+            from recipes.models import Recipe
+            Recipe.recalculate_for_products(changed_cost_ids)
+        
+        return created
+
 
 class PurchaseItem(models.Model):
     """Ítem individual en una compra."""
@@ -321,6 +742,10 @@ class PurchaseItem(models.Model):
         verbose_name = "Ítem de Compra"
         verbose_name_plural = "Ítems de Compra"
         ordering = ['purchase', 'product']
+        indexes = [
+            # Listado por fecha de creación (paginación por cursor)
+            models.Index(fields=['-created_at']),
+        ]
 
     def __str__(self):
         return f"{self.product.name} - {self.quantity_purchased} {self.purchase_unit.name}"
@@ -329,8 +754,17 @@ class PurchaseItem(models.Model):
         """
         Al guardar, calcula el costo neto por unidad base y actualiza el stock del producto.
         """
-        is_new = self.pk is None
+        with transaction.atomic():
+            self._save_and_update_stock(*args, **kwargs)
+
+    def compute_net_cost(self):
+        """
+        Calcula en memoria la cantidad en unidades base y el costo neto del
+        ítem, y asigna el costo neto por unidad base.
         
+        Returns:
+            tuple: (cantidad en unidades base, costo neto sin IVA)
+        """
         # Calcular cantidad en unidades base
         quantity_in_base_units = self.quantity_purchased * self.purchase_unit.conversion_factor
         
@@ -346,77 +780,211 @@ class PurchaseItem(models.Model):
         if quantity_in_base_units > 0:
             self.calculated_net_cost_per_base_unit = net_cost / quantity_in_base_units
         
+        return quantity_in_base_units, net_cost
+
+    def _save_and_update_stock(self, *args, **kwargs):
+        is_new = self.pk is None
+        quantity_in_base_units, net_cost = self.compute_net_cost()
+        
         # Guardar el ítem
         super().save(*args, **kwargs)
         
         # Si es un nuevo ítem, actualizar el stock y costo del producto
         if is_new:
+            previous_cost = self.product.average_cost
             self.product.update_stock_and_cost(
                 quantity_change=quantity_in_base_units,
                 new_item_cost=net_cost,
-                new_quantity_in_base=quantity_in_base_units
+                new_quantity_in_base=quantity_in_base_units,
+                movement_type='PURCHASE',
+                reference=f'purchase_item:{self.pk}'
             )
             
-            # Publicar evento de actualización de stock (se implementará en tasks.py)
-            from inventory.tasks import publish_product_stock_updated
-            publish_product_stock_updated.delay(
-                product_id=self.product.id,
-                new_stock=float(self.product.current_stock),
-                new_cost=float(self.product.average_cost)
+            # Registrar evento de actualización de stock en el outbox
+            OutboxEvent.enqueue(
+                event_type='PRODUCT_STOCK_UPDATED',
+                routing_key='product.stock.updated',
+                aggregate_type='product',
+                aggregate_id=self.product.id,
+                payload={
+                    'product_id': self.product.id,
+                    'new_stock': float(self.product.current_stock),
+                    'new_cost': float(self.product.average_cost),
+                }
             )
+            
+            # Recalcular solo las recetas que usan este producto
+            if self.product.average_cost != previous_cost:
+                from recipes.models import Recipe
+                Recipe.recalculate_for_products([self.product.id])
+
+
+class ProcessedOrder(models.Model):
+    """
+    Registro de órdenes del POS ya aplicadas al inventario.
+    Garantiza que cada orden pagada descuente stock una sola vez,
+    aunque el evento se reciba o reintente varias veces.
+    """
+    order_id = models.CharField(max_length=100, unique=True, verbose_name="ID de Orden")
+    items_count = models.PositiveIntegerField(default=0, verbose_name="Cantidad de Ítems")
+    processed_at = models.DateTimeField(auto_now_add=True, verbose_name="Procesada el")
+
+    class Meta:
+        verbose_name = "Orden Procesada"
+        verbose_name_plural = "Órdenes Procesadas"
+        ordering = ['-processed_at']
+
+    def __str__(self):
+        return f"Orden #{self.order_id}"
+
+    @classmethod
+    def claim(cls, order_id, items_count=0):
+        """
+        Registra la orden como procesada.
+        Debe llamarse dentro de la misma transacción que descuenta el stock.
+        
+        Returns:
+            bool: True si la orden es nueva, False si ya había sido procesada
+        """
+        try:
+            with transaction.atomic():
+                cls.objects.create(order_id=str(order_id), items_count=items_count)
+        except IntegrityError:
+            return False
+        return True
+
+
+class OutboxEvent(models.Model):
+    """
+    Evento pendiente de publicar en el bus (transactional outbox).
+    
+    Se inserta en la misma transacción que el cambio de modelo que lo
+    origina, por lo que solo se publican eventos de cambios confirmados.
+    El relay (`manage.py relay_outbox`) los publica en orden de id.
+    """
+    aggregate_type = models.CharField(max_length=50, verbose_name="Tipo de Agregado")
+    aggregate_id = models.CharField(max_length=100, verbose_name="ID de Agregado")
+    event_type = models.CharField(max_length=100, verbose_name="Tipo de Evento")
+    routing_key = models.CharField(max_length=100, verbose_name="Routing Key")
+    payload = models.JSONField(verbose_name="Payload")
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Intentos de Publicación")
+    created_at = models.DateTimeField(auto_now_add=True)
+    published_at = models.DateTimeField(null=True, blank=True, verbose_name="Publicado el")
+
+    class Meta:
+        verbose_name = "Evento Pendiente"
+        verbose_name_plural = "Eventos Pendientes"
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['published_at', 'id']),
+            models.Index(fields=['aggregate_type', 'aggregate_id']),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} {self.aggregate_type}:{self.aggregate_id}"
+
+    @classmethod
+    def build(cls, event_type, routing_key, aggregate_type, aggregate_id, payload):
+        """Construye (sin guardar) un evento con el formato estándar del bus."""
+        return cls(
+            aggregate_type=aggregate_type,
+            aggregate_id=str(aggregate_id),
+            event_type=event_type,
+            routing_key=routing_key,
+            payload={
+                'event_type': event_type,
+                **payload,
+                'timestamp': str(timezone.now()),
+            },
+        )
+
+    @classmethod
+    def enqueue(cls, event_type, routing_key, aggregate_type, aggregate_id, payload):
+        """Registra un evento para publicar cuando la transacción confirme."""
+        event = cls.build(event_type, routing_key, aggregate_type, aggregate_id, payload)
+        event.save()
+        return event
 
 
 # ====================
 # Signals para Señalización Digital
 # ====================
 
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_init, post_save, post_delete
 from django.dispatch import receiver
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
+
+# Campos del producto que se muestran en el menú de señalización.
+# Cambios en otros campos (ej: current_stock, average_cost) no reconstruyen el menú.
+SIGNAGE_PRODUCT_FIELDS = (
+    'name', 'description', 'description_web', 'category_id', 'image',
+    'web_price', 'display_order', 'is_active_website', 'is_active',
+)
+SIGNAGE_CATEGORY_FIELDS = ('name', 'description')
+
+
+def _signage_values(instance, fields):
+    # Leer desde __dict__ para no disparar consultas por campos diferidos
+    return {field: instance.__dict__.get(field) for field in fields}
+
+
+def _signage_changed(instance, fields, update_fields):
+    """Indica si cambió algún campo visible en el menú desde que se cargó la instancia."""
+    if update_fields is not None:
+        update_fields = {f'{name}_id' if name == 'category' else name for name in update_fields}
+        if not update_fields.intersection(fields):
+            return False
+    loaded = getattr(instance, '_signage_loaded', None)
+    if loaded is None:
+        return True
+    return loaded != _signage_values(instance, fields)
+
+
+@receiver(post_init, sender=Product)
+def product_init_handler(sender, instance, **kwargs):
+    """Guarda los valores visibles en el menú para detectar cambios al guardar."""
+    if instance.pk is not None:
+        instance._signage_loaded = _signage_values(instance, SIGNAGE_PRODUCT_FIELDS)
+
+
+@receiver(post_init, sender=Category)
+def category_init_handler(sender, instance, **kwargs):
+    if instance.pk is not None:
+        instance._signage_loaded = _signage_values(instance, SIGNAGE_CATEGORY_FIELDS)
 
 
 @receiver(post_save, sender=Product)
-def product_saved_handler(sender, instance, created, **kwargs):
+def product_saved_handler(sender, instance, created, update_fields=None, **kwargs):
     """
     Signal que detecta cuando un producto es creado o modificado.
-    Si el producto está activo en la web, envía el menú actualizado
-    a todas las pantallas de TV conectadas vía WebSocket.
+    Si cambia algo visible en el menú de un producto activo en la web (o que
+    acaba de dejar de estarlo), agenda el envío del menú a las pantallas de TV.
+    
+    El envío se hace con debounce en un worker de Celery (ver
+    website_config.tasks.schedule_signage_broadcast), no en este hilo.
     
     Args:
         sender: Clase del modelo (Product)
         instance: Instancia del producto guardado
         created: True si es un nuevo producto
+        update_fields: Campos actualizados, si el guardado fue parcial
         **kwargs: Argumentos adicionales del signal
     """
-    # Solo disparar actualización si el producto está activo en la web
-    # o si acabamos de cambiar su estado
-    if instance.is_active_website:
+    was_active = (getattr(instance, '_signage_loaded', None) or {}).get('is_active_website')
+    if (instance.is_active_website or was_active) and (
+        created or _signage_changed(instance, SIGNAGE_PRODUCT_FIELDS, update_fields)
+    ):
         # Importar aquí para evitar imports circulares
-        from website_config.utils import get_public_menu_data
-        
-        # Obtener el channel layer
-        channel_layer = get_channel_layer()
-        
-        if channel_layer:
-            # Obtener el menú completo actualizado
-            new_menu_data = get_public_menu_data()
-            
-            # Enviar el menú actualizado a todas las TVs conectadas
-            async_to_sync(channel_layer.group_send)(
-                'digital_signage',  # Nombre del grupo (debe coincidir con el Consumer)
-                {
-                    'type': 'signage_update',  # Llama al método signage_update del Consumer
-                    'data': new_menu_data
-                }
-            )
+        from website_config.tasks import schedule_signage_broadcast
+        schedule_signage_broadcast()
+    
+    instance._signage_loaded = _signage_values(instance, SIGNAGE_PRODUCT_FIELDS)
 
 
 @receiver(post_delete, sender=Product)
 def product_deleted_handler(sender, instance, **kwargs):
     """
     Signal que detecta cuando un producto es eliminado.
-    Envía el menú actualizado a todas las pantallas de TV.
+    Agenda el envío del menú actualizado a todas las pantallas de TV.
     
     Args:
         sender: Clase del modelo (Product)
@@ -425,41 +993,20 @@ def product_deleted_handler(sender, instance, **kwargs):
     """
     # Si el producto estaba en la web, actualizar pantallas
     if instance.is_active_website:
-        from website_config.utils import get_public_menu_data
-        
-        channel_layer = get_channel_layer()
-        
-        if channel_layer:
-            new_menu_data = get_public_menu_data()
-            
-            async_to_sync(channel_layer.group_send)(
-                'digital_signage',
-                {
-                    'type': 'signage_update',
-                    'data': new_menu_data
-                }
-            )
+        from website_config.tasks import schedule_signage_broadcast
+        schedule_signage_broadcast()
 
 
 @receiver(post_save, sender=Category)
-def category_saved_handler(sender, instance, **kwargs):
+def category_saved_handler(sender, instance, created, update_fields=None, **kwargs):
     """
     Signal que detecta cuando una categoría es modificada.
     Actualiza las pantallas si hay productos activos en esa categoría.
     """
+    changed = not created and _signage_changed(instance, SIGNAGE_CATEGORY_FIELDS, update_fields)
+    instance._signage_loaded = _signage_values(instance, SIGNAGE_CATEGORY_FIELDS)
+    
     # Solo actualizar si hay productos activos en esta categoría
-    if instance.products.filter(is_active_website=True).exists():
-        from website_config.utils import get_public_menu_data
-        
-        channel_layer = get_channel_layer()
-        
-        if channel_layer:
-            new_menu_data = get_public_menu_data()
-            
-            async_to_sync(channel_layer.group_send)(
-                'digital_signage',
-                {
-                    'type': 'signage_update',
-                    'data': new_menu_data
-                }
-            )
+    if changed and instance.products.filter(is_active_website=True).exists():
+        from website_config.tasks import schedule_signage_broadcast
+        schedule_signage_broadcast()
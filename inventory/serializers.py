@@ -2,8 +2,9 @@
 Serializers para la aplicación Inventory.
 """
 
+from django.db import transaction
 from rest_framework import serializers
-from .models import Category, UnitOfMeasure, Product, PurchaseUnit, Purchase, PurchaseItem
+from .models import Category, UnitOfMeasure, Product, PurchaseUnit, Purchase, PurchaseItem, StockMovement
 from suppliers.serializers import SupplierListSerializer
 
 
@@ -120,6 +121,24 @@ class PurchaseItemSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'calculated_net_cost_per_base_unit', 'created_at', 'updated_at']
 
 
+class StockMovementSerializer(serializers.ModelSerializer):
+    """Serializer para el ledger de movimientos de stock."""
+    movement_type_display = serializers.CharField(source='get_movement_type_display', read_only=True)
+    
+    class Meta:
+        model = StockMovement
+        fields = [
+            'id',
+            'movement_type',
+            'movement_type_display',
+            'quantity',
+            'reference',
+            'notes',
+            'created_at',
+        ]
+        read_only_fields = fields
+
+
 class PurchaseSerializer(serializers.ModelSerializer):
     """Serializer completo para el modelo Purchase."""
     supplier_name = serializers.CharField(source='supplier.name', read_only=True)
@@ -146,7 +165,7 @@ class PurchaseSerializer(serializers.ModelSerializer):
 class PurchaseListSerializer(serializers.ModelSerializer):
     """Serializer simplificado para listado de compras."""
     supplier_name = serializers.CharField(source='supplier.name', read_only=True)
-    items_count = serializers.IntegerField(source='items.count', read_only=True)
+    items_count = serializers.SerializerMethodField()
     
     class Meta:
         model = Purchase
@@ -159,11 +178,38 @@ class PurchaseListSerializer(serializers.ModelSerializer):
             'total_amount',
             'items_count',
         ]
+    
+    def get_items_count(self, obj):
+        """Usa el conteo anotado por el ViewSet; si no existe, lo consulta."""
+        count = getattr(obj, 'items_count', None)
+        return obj.items.count() if count is None else count
+
+
+class PurchaseCreateItemSerializer(serializers.ModelSerializer):
+    """
+    Ítem de una compra nueva. Producto y unidad se reciben como ids y se
+    resuelven en bloque en PurchaseCreateSerializer.validate_items.
+    """
+    product = serializers.IntegerField(source='product_id')
+    purchase_unit = serializers.IntegerField(source='purchase_unit_id')
+    
+    class Meta:
+        model = PurchaseItem
+        fields = [
+            'id',
+            'product',
+            'quantity_purchased',
+            'purchase_unit',
+            'total_cost',
+            'calculated_net_cost_per_base_unit',
+            'notes',
+        ]
+        read_only_fields = ['id', 'calculated_net_cost_per_base_unit']
 
 
 class PurchaseCreateSerializer(serializers.ModelSerializer):
     """Serializer para crear una compra con sus ítems."""
-    items = PurchaseItemSerializer(many=True)
+    items = PurchaseCreateItemSerializer(many=True)
     
     class Meta:
         model = Purchase
@@ -177,15 +223,50 @@ class PurchaseCreateSerializer(serializers.ModelSerializer):
             'items',
         ]
 
-    def create(self, validated_data):
-        """Crear compra con sus ítems."""
-        items_data = validated_data.pop('items')
-        purchase = Purchase.objects.create(**validated_data)
-        
-        for item_data in items_data:
-            PurchaseItem.objects.create(purchase=purchase, **item_data)
+    def validate_items(self, items):
+        """Carga productos y unidades de compra con una consulta por modelo."""
+        products = Product.objects.in_bulk({item['product_id'] for item in items})
+        units = PurchaseUnit.objects.in_bulk({item['purchase_unit_id'] for item in items})
         
-        # Calcular el total
-        purchase.calculate_total()
+        missing_products = sorted({item['product_id'] for item in items} - set(products))
+        missing_units = sorted({item['purchase_unit_id'] for item in items} - set(units))
+        if missing_products or missing_units:
+            errors = {}
+            if missing_products:
+                errors['product'] = f'Productos inexistentes: {missing_products}'
+            if missing_units:
+                errors['purchase_unit'] = f'Unidades de compra inexistentes: {missing_units}'
+            raise serializers.ValidationError(errors)
         
+        return [
+            {
+                **{k: v for k, v in item.items() if k not in ('product_id', 'purchase_unit_id')},
+                'product': products[item['product_id']],
+                'purchase_unit': units[item['purchase_unit_id']],
+            }
+            for item in items
+        ]
+
+    def create(self, validated_data):
+        """Crear compra con sus ítems en bloque (ver Purchase.add_items)."""
+        items_data = validated_data.pop('items')
+        with transaction.atomic():
+            purchase = Purchase.objects.create(**validated_data)
+            purchase.add_items(items_data)
         return purchase
+
+
+class PurchaseImportSerializer(serializers.ModelSerializer):
+    """Datos de la compra y archivo CSV/XLSX para importar una factura."""
+    file = serializers.FileField(write_only=True)
+    
+    class Meta:
+        model = Purchase
+        fields = [
+            'supplier',
+            'purchase_date',
+            'document_type',
+            'document_number',
+            'notes',
+            'file',
+        ]
@@ -5,17 +5,24 @@ Gestiona eventos de actualización de stock y consumo de eventos del bus.
 
 import json
 import logging
+from decimal import Decimal, InvalidOperation
 from celery import shared_task
 from kombu import Connection, Exchange, Queue
 from django.conf import settings
 from django.utils import timezone
+from operations_service.event_bus import publish_event
 
 logger = logging.getLogger(__name__)
 
 
 # Configuración del Event Bus
-EVENT_EXCHANGE = Exchange('operations_events', type='topic', durable=True)
 POS_EXCHANGE = Exchange('pos_events', type='topic', durable=True)
+POS_ORDERS_QUEUE = Queue(
+    'pos_orders_queue',
+    exchange=POS_EXCHANGE,
+    routing_key='order.paid',
+    durable=True
+)
 
 
 @shared_task(bind=True, max_retries=3)
@@ -37,15 +44,7 @@ def publish_product_stock_updated(self, product_id, new_stock, new_cost):
             'timestamp': str(timezone.now()),
         }
         
-        with Connection(settings.EVENT_BUS_URL) as conn:
-            producer = conn.Producer()
-            producer.publish(
-                event_data,
-                exchange=EVENT_EXCHANGE,
-                routing_key='product.stock.updated',
-                serializer='json',
-                retry=True,
-            )
+        publish_event(event_data, routing_key='product.stock.updated')
         
         logger.info(f"Evento PRODUCT_STOCK_UPDATED publicado para producto {product_id}")
         return {'status': 'success', 'product_id': product_id}
@@ -55,6 +54,176 @@ def publish_product_stock_updated(self, product_id, new_stock, new_cost):
         raise self.retry(exc=exc, countdown=60)
 
 
+def stock_event_payload(products):
+    """Serializa productos actualizados para los eventos de stock agregados."""
+    return [
+        {
+            'product_id': product.id,
+            'new_stock': float(product.current_stock),
+            'new_cost': float(product.average_cost),
+        }
+        for product in products
+    ]
+
+
+def parse_order_items(order_ids, items_sold):
+    """
+    Normaliza los ítems vendidos de una orden.
+    
+    Los ids de producto llegan del POS como enteros o strings ("5"); se
+    convierten a int. Los ítems con id o cantidad inválidos se descartan
+    con un error en el log, sin afectar al resto del lote.
+    
+    Returns:
+        list: Tuplas (product_id, cantidad)
+    """
+    parsed = []
+    for item in items_sold:
+        try:
+            product_id = int(item.get('product_id'))
+            quantity = Decimal(str(item.get('quantity') or 0))
+        except (TypeError, ValueError, InvalidOperation, AttributeError):
+            logger.error(f"Ítem inválido en órdenes {order_ids}, se omite: {item!r}")
+            continue
+        parsed.append((product_id, quantity))
+    return parsed
+
+
+def apply_order_items(claimed_orders):
+    """
+    Descuenta el stock de todos los ítems vendidos en un solo paso.
+    
+    Los descuentos se agrupan por producto y se aplican con un único
+    UPDATE atómico (GREATEST(current_stock - cantidad, 0)). Antes se lee
+    el stock bloqueando las filas, para registrar en el ledger el cambio
+    realmente aplicado cuando el stock no alcanza. Luego se leen los
+    valores resultantes con una sola consulta. Debe llamarse dentro de
+    una transacción.
+    
+    Args:
+        claimed_orders: Lista de tuplas (order_id, ítems), con los ítems ya
+            normalizados por parse_order_items
+    
+    Returns:
+        tuple: (productos actualizados ordenados por id,
+            dict {(order_id, product_id): cambio aplicado})
+    """
+    from inventory.models import Product
+    
+    # Agrupar cantidades por producto (una orden puede repetir productos)
+    changes = {}
+    for _, items in claimed_orders:
+        for product_id, quantity in items:
+            changes[product_id] = changes.get(product_id, Decimal('0')) - quantity
+    
+    if not changes:
+        return [], {}
+    
+    order_ids = [order_id for order_id, _ in claimed_orders]
+    previous_stock = dict(
+        Product.objects.select_for_update()
+        .filter(id__in=changes.keys())
+        .order_by('id')
+        .values_list('id', 'current_stock')
+    )
+    Product.objects.apply_stock_changes(changes)
+    products = list(
+        Product.objects.filter(id__in=changes.keys())
+        .only('id', 'name', 'current_stock', 'average_cost')
+        .order_by('id')
+    )
+    
+    missing = set(changes) - set(previous_stock)
+    for product_id in missing:
+        logger.error(f"Producto {product_id} no encontrado para órdenes {order_ids}")
+    
+    # Repartir el cambio aplicado entre las órdenes en el orden del lote,
+    # con el mismo tope en cero que aplica el UPDATE
+    applied = {}
+    running_stock = dict(previous_stock)
+    for order_id, items in claimed_orders:
+        for product_id, quantity in items:
+            if product_id not in running_stock:
+                continue
+            new_stock = max(running_stock[product_id] - quantity, Decimal('0'))
+            key = (order_id, product_id)
+            applied[key] = applied.get(key, Decimal('0')) + new_stock - running_stock[product_id]
+            running_stock[product_id] = new_stock
+    
+    for product in products:
+        logger.info(
+            f"Stock actualizado para producto {product.name}: "
+            f"{product.current_stock - previous_stock[product.id]} "
+            f"(stock actual {product.current_stock})"
+        )
+    
+    return products, applied
+
+
+def apply_paid_orders(orders):
+    """
+    Aplica un lote de órdenes pagadas en la transacción en curso.
+    
+    Cada orden se registra en el ledger de órdenes procesadas; las
+    duplicadas (ya procesadas o repetidas dentro del mismo lote) se omiten.
+    Los ítems de todas las órdenes nuevas se descuentan juntos con un
+    único UPDATE atómico, las ventas se registran en el ledger de
+    movimientos con el cambio aplicado y se registra un único evento
+    PRODUCT_STOCK_BATCH_UPDATED en el outbox.
+    
+    Args:
+        orders: Lista de payloads order.paid
+    
+    Returns:
+        tuple: (IDs de órdenes aplicadas, productos actualizados)
+    """
+    from inventory.models import ProcessedOrder, OutboxEvent, StockMovement
+    
+    claimed_orders = []
+    for order_data in orders:
+        order_id = order_data.get('order_id')
+        order_items = order_data.get('items_sold', [])
+        
+        if order_id is None:
+            logger.error("Orden pagada sin order_id, no se puede procesar de forma idempotente")
+            continue
+        
+        if not ProcessedOrder.claim(order_id, items_count=len(order_items)):
+            logger.warning(f"Orden #{order_id} ya procesada, se omite")
+            continue
+        
+        claimed_orders.append((order_id, parse_order_items([order_id], order_items)))
+    
+    applied_order_ids = [order_id for order_id, _ in claimed_orders]
+    products, sales = apply_order_items(claimed_orders)
+    
+    # Registrar las ventas en el ledger, agrupadas por orden y producto
+    StockMovement.objects.bulk_create([
+        StockMovement(
+            product_id=product_id,
+            movement_type='SALE',
+            quantity=quantity,
+            reference=f'order:{order_id}',
+        )
+        for (order_id, product_id), quantity in sales.items()
+    ])
+    
+    # Un único evento agregado por lote, en la misma transacción
+    if products:
+        OutboxEvent.enqueue(
+            event_type='PRODUCT_STOCK_BATCH_UPDATED',
+            routing_key='product.stock.batch_updated',
+            aggregate_type='order',
+            aggregate_id=applied_order_ids[0],
+            payload={
+                'order_ids': applied_order_ids,
+                'products': stock_event_payload(products),
+            }
+        )
+    
+    return applied_order_ids, products
+
+
 @shared_task(bind=True, max_retries=3)
 def process_order_paid(self, order_data):
     """
@@ -71,46 +240,24 @@ def process_order_paid(self, order_data):
                 ]
             }
     """
-    from inventory.models import Product
     from django.db import transaction
     
     try:
         order_id = order_data.get('order_id')
         items_sold = order_data.get('items_sold', [])
         
+        if order_id is None:
+            logger.error("Orden pagada sin order_id, no se puede procesar de forma idempotente")
+            return {'status': 'invalid', 'order_id': None}
+        
         logger.info(f"Procesando orden pagada #{order_id} con {len(items_sold)} ítems")
         
         with transaction.atomic():
-            for item in items_sold:
-                product_id = item.get('product_id')
-                quantity = item.get('quantity')
-                
-                try:
-                    product = Product.objects.select_for_update().get(id=product_id)
-                    
-                    # Reducir stock
-                    previous_stock = product.current_stock
-                    product.update_stock_and_cost(
-                        quantity_change=-quantity,
-                        new_item_cost=None,
-                        new_quantity_in_base=None
-                    )
-                    
-                    logger.info(
-                        f"Stock actualizado para producto {product.name}: "
-                        f"{previous_stock} -> {product.current_stock}"
-                    )
-                    
-                    # Publicar evento de actualización de stock
-                    publish_product_stock_updated.delay(
-                        product_id=product.id,
-                        new_stock=float(product.current_stock),
-                        new_cost=float(product.average_cost)
-                    )
-                    
-                except Product.DoesNotExist:
-                    logger.error(f"Producto {product_id} no encontrado para orden {order_id}")
-                    continue
+            # El registro en el ledger y el descuento de stock comparten transacción
+            applied_order_ids, _ = apply_paid_orders([order_data])
+        
+        if not applied_order_ids:
+            return {'status': 'duplicate', 'order_id': order_id}
         
         return {'status': 'success', 'order_id': order_id}
         
@@ -124,15 +271,11 @@ def listen_pos_events():
     """
     Task que escucha eventos del servicio POS.
     Debe ser ejecutado como un worker persistente.
-    """
-    from django.utils import timezone
     
-    queue = Queue(
-        'pos_orders_queue',
-        exchange=POS_EXCHANGE,
-        routing_key='order.paid',
-        durable=True
-    )
+    Para alto volumen se recomienda el comando `consume_pos_events`,
+    que procesa los mensajes en micro-lotes sin pasar por Celery.
+    """
+    queue = POS_ORDERS_QUEUE
     
     def process_message(body, message):
         """Callback para procesar mensajes recibidos."""
@@ -160,40 +303,255 @@ def listen_pos_events():
                     continue
 
 
+STOCK_UPDATED_EVENT = 'PRODUCT_STOCK_UPDATED'
+
+
+def coalesce_stock_events(events, mode='batch'):
+    """
+    Etapa de coalescencia para eventos PRODUCT_STOCK_UPDATED.
+    
+    De todos los eventos recibidos conserva solo el último stock y costo
+    de cada producto; los servicios consumidores solo necesitan el valor
+    más reciente.
+    
+    Args:
+        events: Eventos del outbox de tipo PRODUCT_STOCK_UPDATED, en orden de id
+        mode: 'batch' para un único mensaje PRODUCT_STOCK_BATCH_UPDATED,
+            'per_product' para un mensaje PRODUCT_STOCK_UPDATED por producto
+    
+    Returns:
+        list: Tuplas (payload, routing_key) a publicar
+    """
+    latest = {}
+    for event in events:
+        latest[event.aggregate_id] = event.payload
+    
+    if mode == 'per_product':
+        return [(payload, 'product.stock.updated') for payload in latest.values()]
+    
+    return [(
+        {
+            'event_type': 'PRODUCT_STOCK_BATCH_UPDATED',
+            'order_ids': [],
+            'products': [
+                {
+                    'product_id': payload['product_id'],
+                    'new_stock': payload['new_stock'],
+                    'new_cost': payload['new_cost'],
+                }
+                for payload in latest.values()
+            ],
+            'timestamp': str(timezone.now()),
+        },
+        'product.stock.batch_updated',
+    )]
+
+
+# Lock de cache que serializa los relays; debe superar la duración de un lote
+OUTBOX_RELAY_LOCK_KEY = 'outbox:relay:lock'
+OUTBOX_RELAY_LOCK_TIMEOUT = 300
+
+
+def _event_product_ids(event):
+    """Productos a los que se refiere un evento del outbox."""
+    if event.aggregate_type == 'product':
+        return {str(event.aggregate_id)}
+    return {str(p['product_id']) for p in event.payload.get('products', []) if 'product_id' in p}
+
+
+def drain_outbox(batch_size=500):
+    """
+    Publica en el bus un lote de eventos pendientes del outbox.
+    
+    Los eventos se publican en orden de id con un solo productor del pool.
+    Ante el primer error se detiene el lote, de modo que ningún evento se
+    publica antes que otro anterior del mismo agregado. Los relays
+    concurrentes se serializan con un lock en cache; la publicación ocurre
+    fuera de toda transacción y los eventos publicados se marcan al final.
+    
+    Los eventos PRODUCT_STOCK_UPDATED se retienen hasta que el más antiguo
+    cumple la ventana STOCK_EVENT_COALESCE_WINDOW_MS y se publican
+    coalescidos por producto (ver coalesce_stock_events). Mientras un
+    producto tiene eventos de stock retenidos, también se retienen sus
+    eventos posteriores, y los eventos de stock coalescidos se publican
+    antes que cualquier evento posterior del mismo producto.
+    
+    Returns:
+        int: Cantidad de eventos del outbox publicados
+    """
+    from datetime import timedelta
+    from django.core.cache import cache
+    from inventory.models import OutboxEvent
+    from operations_service.event_bus import acquire_producer
+    
+    if not cache.add(OUTBOX_RELAY_LOCK_KEY, 1, timeout=OUTBOX_RELAY_LOCK_TIMEOUT):
+        logger.info("Otro relay está publicando el outbox, se omite este ciclo")
+        return 0
+    
+    try:
+        events = list(
+            OutboxEvent.objects.filter(published_at__isnull=True).order_by('id')[:batch_size]
+        )
+        if not events:
+            return 0
+        
+        # La ventana se cuenta desde el evento de stock pendiente más antiguo
+        window = timedelta(milliseconds=settings.STOCK_EVENT_COALESCE_WINDOW_MS)
+        oldest_stock = next((e for e in events if e.event_type == STOCK_UPDATED_EVENT), None)
+        coalesce_ready = (
+            oldest_stock is None or not window
+            or timezone.now() - oldest_stock.created_at >= window
+        )
+        
+        published = []
+        held_products = set()
+        buffered = []
+        
+        with acquire_producer() as producer:
+            def flush_buffered():
+                """Publica coalescidos los eventos de stock acumulados."""
+                if not buffered:
+                    return True
+                messages = coalesce_stock_events(buffered, settings.STOCK_EVENT_COALESCE_MODE)
+                try:
+                    for payload, routing_key in messages:
+                        publish_event(payload, routing_key=routing_key, producer=producer)
+                except Exception as exc:
+                    logger.error(f"Error publicando eventos de stock coalescidos: {exc}")
+                    return False
+                now = timezone.now()
+                for event in buffered:
+                    event.published_at = now
+                published.extend(buffered)
+                logger.info(f"{len(buffered)} eventos de stock coalescidos en {len(messages)} mensajes")
+                buffered.clear()
+                return True
+            
+            for event in events:
+                product_ids = _event_product_ids(event)
+                
+                if event.event_type == STOCK_UPDATED_EVENT:
+                    if coalesce_ready and not product_ids & held_products:
+                        buffered.append(event)
+                    else:
+                        held_products |= product_ids
+                    continue
+                
+                if product_ids & held_products:
+                    # Un evento anterior del mismo producto sigue pendiente
+                    held_products |= product_ids
+                    continue
+                
+                buffered_ids = set().union(*(_event_product_ids(e) for e in buffered))
+                if product_ids & buffered_ids and not flush_buffered():
+                    buffered.clear()
+                    break
+                
+                try:
+                    publish_event(event.payload, routing_key=event.routing_key, producer=producer)
+                except Exception as exc:
+                    logger.error(f"Error publicando evento del outbox #{event.id}: {exc}")
+                    event.attempts += 1
+                    event.save(update_fields=['attempts'])
+                    buffered.clear()
+                    break
+                event.published_at = timezone.now()
+                published.append(event)
+            else:
+                flush_buffered()
+        
+        OutboxEvent.objects.bulk_update(published, ['published_at'])
+    finally:
+        cache.delete(OUTBOX_RELAY_LOCK_KEY)
+    
+    if published:
+        logger.info(f"{len(published)} eventos del outbox publicados")
+    return len(published)
+
+
+@shared_task
+def relay_outbox_events(batch_size=500):
+    """
+    Tarea para vaciar el outbox desde Celery Beat.
+    Para baja latencia se recomienda el comando `relay_outbox`.
+    """
+    total = 0
+    while True:
+        published = drain_outbox(batch_size)
+        total += published
+        if published < batch_size:
+            break
+    return {'published': total}
+
+
+@shared_task
+def purge_published_outbox_events(days=7):
+    """Elimina los eventos del outbox publicados hace más de `days` días."""
+    from inventory.models import OutboxEvent
+    from datetime import timedelta
+    
+    deleted, _ = OutboxEvent.objects.filter(
+        published_at__lt=timezone.now() - timedelta(days=days)
+    ).delete()
+    return {'deleted': deleted}
+
+
+@shared_task
+def snapshot_stock_levels():
+    """
+    Tarea programada que toma una foto del stock de todos los productos.
+    Acota el cálculo de "stock a una fecha" a la foto más los movimientos
+    posteriores. Puede ejecutarse diariamente con Celery Beat.
+    """
+    from inventory.models import Product, StockMovement, StockSnapshot
+    from django.db import transaction
+    from django.db.models import Max
+    
+    with transaction.atomic():
+        last_movements = dict(
+            StockMovement.objects.values('product_id')
+            .annotate(last_id=Max('id'))
+            .values_list('product_id', 'last_id')
+        )
+        taken_at = timezone.now()
+        snapshots = StockSnapshot.objects.bulk_create([
+            StockSnapshot(
+                product_id=product_id,
+                stock=current_stock,
+                last_movement_id=last_movements.get(product_id, 0),
+                taken_at=taken_at,
+            )
+            for product_id, current_stock in Product.objects.values_list('id', 'current_stock')
+        ], batch_size=1000)
+    
+    logger.info(f"{len(snapshots)} fotos de stock registradas")
+    return {'snapshots': len(snapshots)}
+
+
 @shared_task
 def check_low_stock_alerts():
     """
-    Tarea programada para verificar productos con stock bajo.
-    Puede ejecutarse periódicamente con Celery Beat.
+    Reconciliación periódica de las alertas de stock bajo.
+    
+    Las alertas se emiten al cruzar el umbral, en el mismo UPDATE que
+    modifica el stock (ver ProductQuerySet.emit_low_stock_transitions).
+    Esta tarea solo corrige las filas desfasadas (ej: cambios hechos fuera
+    del ORM) y emite los cruces pendientes; no repite alertas ya emitidas.
     """
     from inventory.models import Product
     
-    low_stock_products = Product.objects.filter(
-        is_active=True,
-        low_stock_threshold__isnull=False
-    )
+    Product.objects.sync_low_stock()
+    events = Product.objects.emit_low_stock_transitions()
     
-    alerts = []
-    for product in low_stock_products:
-        if product.is_low_stock:
-            alerts.append({
-                'product_id': product.id,
-                'product_name': product.name,
-                'current_stock': float(product.current_stock),
-                'threshold': float(product.low_stock_threshold),
-                'unit': product.inventory_unit.abbreviation,
-            })
-    
-    if alerts:
-        logger.warning(f"¡{len(alerts)} productos con stock bajo!")
-        
-        # Aquí se podría enviar una notificación, email, etc.
-        # Por ahora solo logueamos
-        for alert in alerts:
-            logger.warning(
-                f"Stock bajo: {alert['product_name']} - "
-                f"Stock actual: {alert['current_stock']} {alert['unit']} "
-                f"(umbral: {alert['threshold']})"
-            )
+    for event in events:
+        logger.warning(
+            f"{event.event_type}: {event.payload['product_name']} - "
+            f"Stock actual: {event.payload['current_stock']} "
+            f"(umbral: {event.payload['threshold']})"
+        )
     
-    return {'total_alerts': len(alerts), 'alerts': alerts}
+    return {
+        'low_stock': [e.payload['product_id'] for e in events if e.event_type == 'PRODUCT_LOW_STOCK'],
+        'recovered': [e.payload['product_id'] for e in events if e.event_type == 'PRODUCT_STOCK_RECOVERED'],
+        'total_alerts': Product.objects.filter(is_active=True).low_stock().count(),
+    }
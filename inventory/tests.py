@@ -2,13 +2,18 @@
 Tests para la aplicación Inventory.
 """
 
+from unittest import mock
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient
 from rest_framework import status
 from decimal import Decimal
-from .models import Category, UnitOfMeasure, Product, PurchaseUnit
+from .models import (
+    Category, UnitOfMeasure, Product, PurchaseUnit, ProcessedOrder, OutboxEvent,
+    StockMovement,
+)
 from suppliers.models import Supplier
+from operations_service.testing import ConstantQueriesMixin
 
 User = get_user_model()
 
@@ -43,6 +48,46 @@ class InventoryModelTest(TestCase):
         )
         self.assertTrue(product.is_low_stock)
 
+    def test_update_stock_and_cost_purchase(self):
+        """Test compra con costo promedio ponderado calculado en la base de datos."""
+        product = Product.objects.create(
+            name='Weighted Product',
+            category=self.category,
+            inventory_unit=self.unit,
+            current_stock=Decimal('10.000'),
+            average_cost=Decimal('100.00')
+        )
+        product.update_stock_and_cost(
+            quantity_change=Decimal('30.000'),
+            new_item_cost=Decimal('6000.00'),
+            new_quantity_in_base=Decimal('30.000')
+        )
+        # (10 * 100 + 6000) / 40 = 175
+        self.assertEqual(product.current_stock, Decimal('40.000'))
+        self.assertEqual(product.average_cost, Decimal('175.00'))
+
+    def test_apply_stock_changes_never_negative(self):
+        """Test los descuentos de stock se aplican en un UPDATE y no bajan de cero."""
+        first = Product.objects.create(
+            name='First', category=self.category, inventory_unit=self.unit,
+            current_stock=Decimal('5.000')
+        )
+        second = Product.objects.create(
+            name='Second', category=self.category, inventory_unit=self.unit,
+            current_stock=Decimal('5.000')
+        )
+        # UPDATE de stock + SELECT de cruces del umbral de stock bajo
+        with self.assertNumQueries(2):
+            updated = Product.objects.apply_stock_changes({
+                first.id: Decimal('-2.5'),
+                second.id: -8,
+            })
+        self.assertEqual(updated, 2)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.current_stock, Decimal('2.500'))
+        self.assertEqual(second.current_stock, Decimal('0.000'))
+
 
 class InventoryAPITest(TestCase):
     """Tests para la API de Inventory."""
@@ -72,6 +117,26 @@ class InventoryAPITest(TestCase):
         )
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
 
+    def test_adjust_stock_insufficient(self):
+        """Test salida de stock condicionada al stock disponible."""
+        from django.urls import reverse
+
+        product = Product.objects.create(
+            name='Adjust Product',
+            category=self.category,
+            inventory_unit=self.unit,
+            current_stock=Decimal('3.000')
+        )
+        url = reverse('product-adjust-stock', args=[product.id])
+
+        response = self.client.post(url, {'tipo_ajuste': 'salida', 'cantidad': 5}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(url, {'tipo_ajuste': 'salida', 'cantidad': 2}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        product.refresh_from_db()
+        self.assertEqual(product.current_stock, Decimal('1.000'))
+
     def test_list_products_api(self):
         """Test listar productos vía API."""
         Product.objects.create(
@@ -81,3 +146,896 @@ class InventoryAPITest(TestCase):
         )
         response = self.client.get('/api/operations/inventory/products/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class ProcessOrderPaidTest(TestCase):
+    """Tests para el procesamiento de órdenes pagadas del POS."""
+
+    def setUp(self):
+        self.category = Category.objects.create(name='POS Category')
+        self.unit = UnitOfMeasure.objects.create(name='Unidad', abbreviation='u')
+        self.product_a = Product.objects.create(
+            name='Producto A',
+            category=self.category,
+            inventory_unit=self.unit,
+            current_stock=Decimal('10.000')
+        )
+        self.product_b = Product.objects.create(
+            name='Producto B',
+            category=self.category,
+            inventory_unit=self.unit,
+            current_stock=Decimal('1.000')
+        )
+
+    def test_order_decrements_stock_in_batch(self):
+        """Test descuento agrupado de stock y evento único por orden."""
+        from inventory.tasks import process_order_paid
+
+        process_order_paid({
+            'order_id': 1,
+            'items_sold': [
+                {'product_id': self.product_a.id, 'quantity': 2},
+                {'product_id': self.product_b.id, 'quantity': 5},
+                {'product_id': self.product_a.id, 'quantity': 1.5},
+                {'product_id': 999999, 'quantity': 1},
+            ]
+        })
+
+        self.product_a.refresh_from_db()
+        self.product_b.refresh_from_db()
+        self.assertEqual(self.product_a.current_stock, Decimal('6.500'))
+        self.assertEqual(self.product_b.current_stock, Decimal('0.000'))
+
+        event = OutboxEvent.objects.get()
+        self.assertEqual(event.event_type, 'PRODUCT_STOCK_BATCH_UPDATED')
+        products = event.payload['products']
+        self.assertEqual(
+            [p['product_id'] for p in products],
+            [self.product_a.id, self.product_b.id]
+        )
+
+    def test_duplicate_order_is_skipped(self):
+        """Test una orden reentregada no descuenta stock dos veces."""
+        from inventory.tasks import process_order_paid
+
+        order = {
+            'order_id': 42,
+            'items_sold': [{'product_id': self.product_a.id, 'quantity': 3}]
+        }
+        process_order_paid(order)
+        result = process_order_paid(order)
+
+        self.assertEqual(result['status'], 'duplicate')
+        self.product_a.refresh_from_db()
+        self.assertEqual(self.product_a.current_stock, Decimal('7.000'))
+        self.assertEqual(ProcessedOrder.objects.filter(order_id='42').count(), 1)
+        self.assertEqual(OutboxEvent.objects.count(), 1)
+
+    def test_apply_paid_orders_batch(self):
+        """Test aplicar un micro-lote de órdenes omitiendo duplicadas."""
+        from inventory.tasks import apply_paid_orders
+
+        order = {'order_id': 7, 'items_sold': [{'product_id': self.product_a.id, 'quantity': 1}]}
+        applied, products = apply_paid_orders([
+            order,
+            {'order_id': 8, 'items_sold': [{'product_id': self.product_a.id, 'quantity': 2}]},
+            order,
+        ])
+
+        self.assertEqual(applied, [7, 8])
+        self.assertEqual(len(products), 1)
+        self.product_a.refresh_from_db()
+        self.assertEqual(self.product_a.current_stock, Decimal('7.000'))
+
+    def test_consumer_isolates_failing_order(self):
+        """Test una orden que falla se rechaza sin bloquear el resto del lote."""
+        from inventory.management.commands.consume_pos_events import Command
+        from inventory.tasks import apply_paid_orders as real_apply
+
+        command = Command()
+        good = mock.MagicMock()
+        bad = mock.MagicMock()
+        command.buffer = [
+            ({'order_id': 50, 'items_sold': [{'product_id': self.product_a.id, 'quantity': 1}]}, good),
+            ({'order_id': 51, 'items_sold': []}, bad),
+        ]
+
+        def apply(orders):
+            if any(order['order_id'] == 51 for order in orders):
+                raise ValueError('payload inválido')
+            return real_apply(orders)
+
+        with mock.patch(
+            'inventory.management.commands.consume_pos_events.apply_paid_orders', side_effect=apply
+        ):
+            command.flush()
+
+        good.ack.assert_called_once_with()
+        bad.reject.assert_called_once_with()
+        bad.requeue.assert_not_called()
+        self.product_a.refresh_from_db()
+        self.assertEqual(self.product_a.current_stock, Decimal('9.000'))
+
+    def test_string_product_ids_are_accepted(self):
+        """Test los ids de producto como string se convierten; los inválidos se omiten."""
+        from inventory.tasks import apply_paid_orders
+
+        applied, products = apply_paid_orders([{
+            'order_id': 9,
+            'items_sold': [
+                {'product_id': str(self.product_a.id), 'quantity': '2'},
+                {'product_id': 'abc', 'quantity': 1},
+            ],
+        }])
+
+        self.assertEqual(applied, [9])
+        self.assertEqual([p.id for p in products], [self.product_a.id])
+        self.product_a.refresh_from_db()
+        self.assertEqual(self.product_a.current_stock, Decimal('8.000'))
+        self.assertEqual(
+            StockMovement.objects.get(reference='order:9').quantity, Decimal('-2.000')
+        )
+
+
+class EventBusTest(TestCase):
+    """Tests para la publicación de eventos con el pool de productores."""
+
+    @mock.patch('operations_service.event_bus.producers')
+    def test_publish_reuses_pooled_connection(self, mock_producers):
+        """Test los eventos se publican con productores del pool compartido."""
+        from operations_service.event_bus import get_connection
+        from inventory.tasks import publish_product_stock_updated
+
+        publish_product_stock_updated(product_id=1, new_stock=5.0, new_cost=10.0)
+        publish_product_stock_updated(product_id=2, new_stock=1.0, new_cost=3.0)
+
+        connection = get_connection()
+        self.assertTrue(connection.transport_options['confirm_publish'])
+        self.assertEqual(
+            [c.args[0] for c in mock_producers.__getitem__.call_args_list],
+            [connection, connection]
+        )
+        producer = mock_producers.__getitem__.return_value.acquire.return_value.__enter__.return_value
+        self.assertEqual(producer.publish.call_count, 2)
+        self.assertEqual(
+            producer.publish.call_args.kwargs['routing_key'],
+            'product.stock.updated'
+        )
+
+
+class OutboxRelayTest(TestCase):
+    """Tests para el relay del outbox de eventos."""
+
+    def setUp(self):
+        for recipe_id in (1, 2, 3):
+            OutboxEvent.enqueue(
+                event_type='RECIPE_UPDATED',
+                routing_key='recipe.updated',
+                aggregate_type='recipe',
+                aggregate_id=recipe_id,
+                payload={'recipe_id': recipe_id}
+            )
+
+    def enqueue_stock_event(self, product_id, new_stock):
+        return OutboxEvent.enqueue(
+            event_type='PRODUCT_STOCK_UPDATED',
+            routing_key='product.stock.updated',
+            aggregate_type='product',
+            aggregate_id=product_id,
+            payload={'product_id': product_id, 'new_stock': new_stock, 'new_cost': 1.0}
+        )
+
+    @mock.patch('operations_service.event_bus.producers')
+    def test_drain_publishes_in_order(self, mock_producers):
+        """Test el relay publica los eventos pendientes en orden y los marca."""
+        from inventory.tasks import drain_outbox
+
+        self.assertEqual(drain_outbox(batch_size=10), 3)
+
+        producer = mock_producers.__getitem__.return_value.acquire.return_value.__enter__.return_value
+        self.assertEqual(
+            [c.args[0]['recipe_id'] for c in producer.publish.call_args_list],
+            [1, 2, 3]
+        )
+        self.assertFalse(OutboxEvent.objects.filter(published_at__isnull=True).exists())
+        self.assertEqual(drain_outbox(batch_size=10), 0)
+
+    @mock.patch('operations_service.event_bus.producers')
+    def test_drain_stops_at_first_failure(self, mock_producers):
+        """Test un error de publicación detiene el lote para conservar el orden."""
+        from inventory.tasks import drain_outbox
+
+        producer = mock_producers.__getitem__.return_value.acquire.return_value.__enter__.return_value
+        producer.publish.side_effect = [None, ConnectionError('broker caído'), None]
+
+        self.assertEqual(drain_outbox(batch_size=10), 1)
+
+        pending = OutboxEvent.objects.filter(published_at__isnull=True).order_by('id')
+        self.assertEqual([e.payload['recipe_id'] for e in pending], [2, 3])
+        self.assertEqual(pending[0].attempts, 1)
+
+    @mock.patch('operations_service.event_bus.producers')
+    def test_stock_events_are_coalesced_per_product(self, mock_producers):
+        """Test los eventos de stock se reducen al último valor por producto."""
+        from inventory.tasks import drain_outbox
+
+        OutboxEvent.objects.all().delete()
+        for new_stock in (10.0, 9.0, 8.0):
+            self.enqueue_stock_event(1, new_stock)
+        self.enqueue_stock_event(2, 4.0)
+
+        producer = mock_producers.__getitem__.return_value.acquire.return_value.__enter__.return_value
+
+        with self.settings(STOCK_EVENT_COALESCE_WINDOW_MS=60000):
+            self.assertEqual(drain_outbox(batch_size=10), 0)
+        producer.publish.assert_not_called()
+
+        with self.settings(STOCK_EVENT_COALESCE_WINDOW_MS=0, STOCK_EVENT_COALESCE_MODE='batch'):
+            self.assertEqual(drain_outbox(batch_size=10), 4)
+        producer.publish.assert_called_once()
+        message = producer.publish.call_args.args[0]
+        self.assertEqual(message['event_type'], 'PRODUCT_STOCK_BATCH_UPDATED')
+        self.assertEqual(
+            [(p['product_id'], p['new_stock']) for p in message['products']],
+            [(1, 8.0), (2, 4.0)]
+        )
+
+    @mock.patch('operations_service.event_bus.producers')
+    def test_coalescing_keeps_per_product_order(self, mock_producers):
+        """Test un evento posterior del producto no se publica antes que su stock retenido."""
+        from inventory.tasks import drain_outbox
+
+        OutboxEvent.objects.all().delete()
+        self.enqueue_stock_event(1, 50.0)
+        OutboxEvent.enqueue(
+            event_type='PRODUCT_STOCK_BATCH_UPDATED',
+            routing_key='product.stock.batch_updated',
+            aggregate_type='order',
+            aggregate_id=1,
+            payload={'order_ids': [1], 'products': [{'product_id': 1, 'new_stock': 48.0, 'new_cost': 1.0}]}
+        )
+        OutboxEvent.enqueue(
+            event_type='RECIPE_UPDATED',
+            routing_key='recipe.updated',
+            aggregate_type='recipe',
+            aggregate_id=9,
+            payload={'recipe_id': 9}
+        )
+
+        producer = mock_producers.__getitem__.return_value.acquire.return_value.__enter__.return_value
+
+        with self.settings(STOCK_EVENT_COALESCE_WINDOW_MS=60000):
+            self.assertEqual(drain_outbox(batch_size=10), 1)
+        self.assertEqual(producer.publish.call_args.args[0]['recipe_id'], 9)
+
+        producer.publish.reset_mock()
+        with self.settings(STOCK_EVENT_COALESCE_WINDOW_MS=0):
+            self.assertEqual(drain_outbox(batch_size=10), 2)
+        self.assertEqual(
+            [c.args[0]['products'][0]['new_stock'] for c in producer.publish.call_args_list],
+            [50.0, 48.0]
+        )
+
+    def test_coalesce_per_product_mode(self):
+        """Test modo de un mensaje por producto con el último stock."""
+        from inventory.tasks import coalesce_stock_events
+
+        events = [
+            self.enqueue_stock_event(1, 5.0),
+            self.enqueue_stock_event(1, 3.0),
+        ]
+        messages = coalesce_stock_events(events, mode='per_product')
+
+        self.assertEqual(len(messages), 1)
+        payload, routing_key = messages[0]
+        self.assertEqual(payload['new_stock'], 3.0)
+        self.assertEqual(routing_key, 'product.stock.updated')
+
+
+class StockLedgerTest(TestCase):
+    """Tests para el ledger de movimientos y las fotos de stock."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='ledger', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+
+        self.category = Category.objects.create(name='Ledger Category')
+        self.unit = UnitOfMeasure.objects.create(name='Litro', abbreviation='l')
+        self.product = Product.objects.create(
+            name='Leche',
+            category=self.category,
+            inventory_unit=self.unit,
+        )
+
+    def test_movements_are_recorded(self):
+        """Test compras, ventas y mermas quedan registradas en el ledger."""
+        from django.urls import reverse
+        from inventory.tasks import process_order_paid
+
+        self.product.update_stock_and_cost(
+            Decimal('10'), Decimal('20'), Decimal('10'), movement_type='PURCHASE'
+        )
+        process_order_paid({
+            'order_id': 100,
+            'items_sold': [{'product_id': self.product.id, 'quantity': 4}]
+        })
+        url = reverse('product-adjust-stock', args=[self.product.id])
+        response = self.client.post(url, {'tipo_ajuste': 'merma', 'cantidad': 1}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        movements = list(self.product.stock_movements.order_by('id'))
+        self.assertEqual(
+            [(m.movement_type, m.quantity) for m in movements],
+            [('PURCHASE', Decimal('10.000')), ('SALE', Decimal('-4.000')), ('WASTE', Decimal('-1.000'))]
+        )
+        self.assertEqual(movements[1].reference, 'order:100')
+
+    def test_stock_as_of_uses_snapshot(self):
+        """Test stock a una fecha parte de la última foto."""
+        from django.utils import timezone
+        from inventory.tasks import snapshot_stock_levels
+
+        self.product.update_stock_and_cost(Decimal('5'), movement_type='ADJUSTMENT')
+        snapshot_stock_levels()
+        self.product.update_stock_and_cost(Decimal('2'), movement_type='ADJUSTMENT')
+
+        snapshot = self.product.stock_snapshots.order_by('-id').first()
+        self.assertEqual(snapshot.stock, Decimal('5.000'))
+        self.assertEqual(self.product.stock_as_of(timezone.now()), Decimal('7.000'))
+
+    def test_opening_balance_snapshot(self):
+        """Test un producto creado con stock tiene saldo inicial para stock_as_of."""
+        from django.utils import timezone
+
+        product = Product.objects.create(
+            name='Crema', category=self.category, inventory_unit=self.unit,
+            current_stock=Decimal('10.000')
+        )
+        self.assertEqual(product.stock_as_of(timezone.now()), Decimal('10.000'))
+
+    def test_sales_ledger_records_applied_changes(self):
+        """Test órdenes repetidas en el lote y descuentos topados en cero."""
+        from inventory.tasks import apply_paid_orders
+
+        Product.objects.filter(pk=self.product.pk).update(current_stock=Decimal('10'))
+        order = {'order_id': 200, 'items_sold': [{'product_id': self.product.id, 'quantity': 1}]}
+        apply_paid_orders([order, order])
+        apply_paid_orders([
+            {'order_id': 201, 'items_sold': [{'product_id': self.product.id, 'quantity': 6}]},
+            {'order_id': 202, 'items_sold': [{'product_id': self.product.id, 'quantity': 5}]},
+        ])
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.current_stock, Decimal('0.000'))
+        sales = dict(
+            StockMovement.objects.filter(movement_type='SALE')
+            .values_list('reference', 'quantity')
+        )
+        self.assertEqual(sales, {
+            'order:200': Decimal('-1.000'),
+            'order:201': Decimal('-6.000'),
+            'order:202': Decimal('-3.000'),
+        })
+
+    def test_stock_history_keyset_pagination(self):
+        """Test historial paginado por cursor."""
+        from django.urls import reverse
+
+        StockMovement.record([(self.product.id, 1)] * 5, 'ADJUSTMENT')
+        url = reverse('product-stock-history', args=[self.product.id])
+
+        response = self.client.get(url, {'limit': 3})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        first_page = response.data['movements']
+        self.assertEqual(len(first_page), 3)
+        self.assertIsNotNone(response.data['next_cursor'])
+
+        response = self.client.get(url, {'limit': 3, 'before': response.data['next_cursor']})
+        self.assertEqual(len(response.data['movements']), 2)
+        self.assertIsNone(response.data['next_cursor'])
+        self.assertLess(response.data['movements'][0]['id'], first_page[-1]['id'])
+
+    def test_stock_history_invalid_params(self):
+        """Test límites fuera de rango y fechas inexistentes no causan error 500."""
+        from django.urls import reverse
+
+        StockMovement.record([(self.product.id, 1)] * 2, 'ADJUSTMENT')
+        url = reverse('product-stock-history', args=[self.product.id])
+
+        for limit in (0, -1):
+            response = self.client.get(url, {'limit': limit})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(response.data['movements']), 1)
+            self.assertIsNotNone(response.data['next_cursor'])
+
+        response = self.client.get(url, {'as_of': '2024-02-30'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(url, {'as_of': '2024-02-30T10:00:00'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class PurchaseCursorPaginationTest(TestCase):
+    """Tests para la paginación por cursor opcional."""
+
+    def setUp(self):
+        from datetime import date
+        from .models import Purchase
+
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='cursor', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+
+        supplier = Supplier.objects.create(name='Cursor Supplier', rut='11111111-1')
+        self.purchases = [
+            Purchase.objects.create(
+                supplier=supplier,
+                purchase_date=date(2024, 1, day),
+                document_type='BOLETA',
+                document_number=f'B-{number}',
+            )
+            for number, day in enumerate((1, 2, 2, 3))
+        ]
+
+    def test_cursor_pagination_walks_all_pages(self):
+        """Test ?pagination=cursor recorre todas las compras sin COUNT(*)."""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from django.urls import reverse
+
+        url = reverse('purchase-list')
+        ids = []
+        params = {'pagination': 'cursor', 'page_size': 2}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        # Sin la consulta COUNT(*) del paginador
+        self.assertFalse(any('"__count"' in q['sql'] for q in queries.captured_queries))
+        self.assertNotIn('count', response.data)
+
+        while True:
+            ids += [p['id'] for p in response.data['results']]
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+
+        expected = sorted(self.purchases, key=lambda p: (p.purchase_date, p.id), reverse=True)
+        self.assertEqual(ids, [p.id for p in expected])
+
+    def test_page_number_is_default(self):
+        """Test sin el parámetro se mantiene la paginación por página."""
+        from django.urls import reverse
+
+        response = self.client.get(reverse('purchase-list'))
+        self.assertEqual(response.data['count'], 4)
+
+
+class ListQueryCountTest(ConstantQueriesMixin, TestCase):
+    """Regresión: los listados ejecutan un número constante de consultas."""
+
+    def setUp(self):
+        from .models import PurchaseUnit
+
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='queries', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+
+        self.unit = UnitOfMeasure.objects.create(name='Gramo', abbreviation='g')
+        self.purchase_unit = PurchaseUnit.objects.create(
+            name='Saco', base_unit=self.unit, conversion_factor=Decimal('1000')
+        )
+        self.supplier = Supplier.objects.create(name='Query Supplier', rut='22222222-2')
+        self.rows = 0
+
+    def add_row(self):
+        from datetime import date
+        from .models import Purchase, PurchaseItem
+
+        self.rows += 1
+        category = Category.objects.create(name=f'Categoría {self.rows}')
+        product = Product.objects.create(
+            name=f'Producto {self.rows}', category=category, inventory_unit=self.unit
+        )
+        purchase = Purchase.objects.create(
+            supplier=self.supplier,
+            purchase_date=date(2024, 1, 1),
+            document_type='BOLETA',
+            document_number=f'Q-{self.rows}',
+        )
+        PurchaseItem.objects.create(
+            purchase=purchase,
+            product=product,
+            quantity_purchased=Decimal('1'),
+            purchase_unit=self.purchase_unit,
+            total_cost=Decimal('1000'),
+        )
+
+    def test_products_list(self):
+        self.assertConstantListQueries('product-list')
+
+    def test_purchases_list(self):
+        self.assertConstantListQueries('purchase-list')
+
+    def test_purchase_items_list(self):
+        self.assertConstantListQueries('purchase-item-list')
+
+    def test_purchase_units_list(self):
+        self.assertConstantListQueries('purchase-unit-list')
+
+
+class LowStockFlagTest(TestCase):
+    """Tests para la columna materializada de stock bajo."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='lowstock', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+
+        self.category = Category.objects.create(name='Low Stock Category')
+        self.unit = UnitOfMeasure.objects.create(name='Kilo', abbreviation='kg')
+        self.product = Product.objects.create(
+            name='Harina',
+            category=self.category,
+            inventory_unit=self.unit,
+            current_stock=Decimal('20.000'),
+            low_stock_threshold=Decimal('5.000'),
+        )
+        self.no_threshold = Product.objects.create(
+            name='Sal',
+            category=self.category,
+            inventory_unit=self.unit,
+        )
+
+    def test_flag_follows_stock_changes(self):
+        """Test el UPDATE de stock mantiene la columna low_stock."""
+        self.assertFalse(self.product.low_stock)
+
+        Product.objects.apply_stock_changes({
+            self.product.pk: Decimal('-16'),
+            self.no_threshold.pk: Decimal('-1'),
+        })
+        self.product.refresh_from_db()
+        self.no_threshold.refresh_from_db()
+        self.assertEqual(self.product.current_stock, Decimal('4.000'))
+        self.assertTrue(self.product.low_stock)
+        self.assertFalse(self.no_threshold.low_stock)
+
+        self.product.update_stock_and_cost(Decimal('10'), Decimal('100'), Decimal('10'))
+        self.assertFalse(self.product.low_stock)
+
+    def test_flag_follows_threshold_changes(self):
+        """Test cambiar el umbral con save() actualiza low_stock."""
+        self.product.low_stock_threshold = Decimal('25.000')
+        self.product.save(update_fields=['low_stock_threshold'])
+        self.product.refresh_from_db()
+        self.assertTrue(self.product.low_stock)
+
+    def test_sync_low_stock(self):
+        """Test sync_low_stock corrige filas desfasadas."""
+        Product.objects.filter(pk=self.product.pk).update(current_stock=Decimal('1'))
+        self.assertEqual(Product.objects.sync_low_stock(), 1)
+        self.assertEqual(list(Product.objects.low_stock()), [self.product])
+
+    def test_low_stock_endpoint_is_paginated(self):
+        """Test el endpoint filtra en la base y pagina."""
+        from django.urls import reverse
+        from inventory.tasks import check_low_stock_alerts
+
+        self.product.update_stock_and_cost(Decimal('-18'))
+
+        response = self.client.get(reverse('product-low-stock'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(response.data['results'][0]['id'], self.product.pk)
+
+        result = check_low_stock_alerts()
+        self.assertEqual(result['total_alerts'], 1)
+
+    def test_threshold_crossings_emit_events_once(self):
+        """Test cada cruce del umbral emite un único evento."""
+        from inventory.tasks import check_low_stock_alerts
+
+        def alert_events():
+            return list(
+                OutboxEvent.objects.filter(
+                    event_type__in=['PRODUCT_LOW_STOCK', 'PRODUCT_STOCK_RECOVERED']
+                ).values_list('event_type', flat=True)
+            )
+
+        self.product.update_stock_and_cost(Decimal('-16'))
+        self.product.update_stock_and_cost(Decimal('-1'))
+        self.assertEqual(alert_events(), ['PRODUCT_LOW_STOCK'])
+        self.assertTrue(self.product.low_stock_alerted)
+
+        result = check_low_stock_alerts()
+        self.assertEqual(result['low_stock'], [])
+        self.assertEqual(len(alert_events()), 1)
+
+        self.product.update_stock_and_cost(Decimal('10'))
+        self.product.update_stock_and_cost(Decimal('5'))
+        self.assertEqual(alert_events(), ['PRODUCT_LOW_STOCK', 'PRODUCT_STOCK_RECOVERED'])
+
+        # Cambios fuera del ORM se detectan en la reconciliación
+        Product.objects.filter(pk=self.product.pk).update(current_stock=Decimal('0'))
+        result = check_low_stock_alerts()
+        self.assertEqual(result['low_stock'], [self.product.pk])
+        self.assertEqual(alert_events()[-1], 'PRODUCT_LOW_STOCK')
+
+
+class PurchaseBulkCreateTest(TestCase):
+    """Tests para la creación en bloque de compras con sus ítems."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='bulkpurchase', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+
+        category = Category.objects.create(name='Bulk Category')
+        unit = UnitOfMeasure.objects.create(name='Gramo', abbreviation='g')
+        self.supplier = Supplier.objects.create(name='Bulk Supplier', rut='22222222-2')
+        self.purchase_unit = PurchaseUnit.objects.create(
+            name='Saco 1kg', base_unit=unit, conversion_factor=Decimal('1000')
+        )
+        self.products = [
+            Product.objects.create(name=f'Insumo {n}', category=category, inventory_unit=unit)
+            for n in range(6)
+        ]
+        self.documents = 0
+
+    def post_purchase(self, products):
+        from django.urls import reverse
+
+        self.documents += 1
+        return self.client.post(reverse('purchase-list'), {
+            'supplier': self.supplier.id,
+            'purchase_date': '2024-01-01',
+            'document_type': 'FACTURA',
+            'document_number': f'F-{self.documents}',
+            'items': [
+                {
+                    'product': product.id,
+                    'quantity_purchased': '2',
+                    'purchase_unit': self.purchase_unit.id,
+                    'total_cost': '2380',
+                }
+                for product in products
+            ],
+        }, format='json')
+
+    def test_items_update_stock_cost_and_total(self):
+        """Test la compra actualiza stock, costo, total, ledger y outbox."""
+        first = self.products[0]
+        response = self.post_purchase([first, first, self.products[1]])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data['items']), 3)
+
+        first.refresh_from_db()
+        self.assertEqual(first.current_stock, Decimal('4000.000'))
+        self.assertEqual(first.average_cost, Decimal('1.00'))
+
+        purchase = first.purchase_items.get(pk=response.data['items'][0]['id']).purchase
+        self.assertEqual(purchase.total_amount, Decimal('7140.00'))
+        self.assertEqual(
+            StockMovement.objects.get(product=first).quantity, Decimal('4000.000')
+        )
+        events = OutboxEvent.objects.filter(event_type='PRODUCT_STOCK_BATCH_UPDATED')
+        self.assertEqual(events.count(), 1)
+        self.assertEqual(len(events.get().payload['products']), 2)
+
+    def test_query_count_is_constant(self):
+        """Test la cantidad de consultas no depende de los ítems."""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as few:
+            self.post_purchase(self.products[:1])
+        with CaptureQueriesContext(connection) as many:
+            self.post_purchase(self.products)
+        self.assertEqual(len(many), len(few))
+
+    def test_unknown_product_is_rejected(self):
+        """Test los productos inexistentes se informan sin crear la compra."""
+        from .models import Purchase
+
+        missing = Product(id=9999)
+        response = self.post_purchase([missing])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Purchase.objects.exists())
+
+
+class PurchaseInvoiceImportTest(TestCase):
+    """Tests para la importación de facturas CSV/XLSX."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='importer', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+
+        category = Category.objects.create(name='Import Category')
+        unit = UnitOfMeasure.objects.create(name='Gramo', abbreviation='g')
+        self.supplier = Supplier.objects.create(name='Import Supplier', rut='33333333-3')
+        self.purchase_unit = PurchaseUnit.objects.create(
+            name='Saco 1kg', base_unit=unit, conversion_factor=Decimal('1000')
+        )
+        self.flour = Product.objects.create(name='Harina', category=category, inventory_unit=unit)
+        self.sugar = Product.objects.create(name='Azúcar', category=category, inventory_unit=unit)
+
+    def post_file(self, upload, number='F-1'):
+        from django.urls import reverse
+
+        return self.client.post(reverse('purchase-import-invoice'), {
+            'supplier': self.supplier.id,
+            'purchase_date': '2024-01-31',
+            'document_type': 'BOLETA',
+            'document_number': number,
+            'file': upload,
+        }, format='multipart')
+
+    def test_csv_import_reports_row_errors(self):
+        """Test las filas válidas se importan y las inválidas se informan."""
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        content = (
+            'producto,unidad,cantidad,costo_total,notas\n'
+            f'{self.flour.id},{self.purchase_unit.id},2,2000,\n'
+            'azúcar,Saco 1kg,"1,5",1500,granulada\n'
+            'Harina,Saco 1kg,1,1000,\n'
+            'Inexistente,Saco 1kg,abc,10,\n'
+        ).encode('utf-8')
+        response = self.post_file(SimpleUploadedFile('factura.csv', content))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['imported_rows'], 3)
+        self.assertEqual(response.data['error_count'], 1)
+        self.assertEqual(response.data['errors'][0]['row'], 5)
+        self.assertEqual(
+            set(response.data['errors'][0]['errors']), {'product', 'quantity_purchased'}
+        )
+        self.assertEqual(response.data['purchase']['total_amount'], '4500.00')
+
+        self.flour.refresh_from_db()
+        self.sugar.refresh_from_db()
+        self.assertEqual(self.flour.current_stock, Decimal('3000.000'))
+        self.assertEqual(self.flour.average_cost, Decimal('1.00'))
+        self.assertEqual(self.sugar.current_stock, Decimal('1500.000'))
+
+    def test_file_without_valid_rows_creates_nothing(self):
+        """Test sin filas válidas no se crea la compra."""
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from .models import Purchase
+
+        response = self.post_file(SimpleUploadedFile('factura.csv', b'producto,unidad\nx,y\n'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.post_file(SimpleUploadedFile(
+            'factura.csv', b'producto,unidad,cantidad,costo_total\nx,y,1,1\n'
+        ))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['error_count'], 1)
+        self.assertFalse(Purchase.objects.exists())
+
+    def test_non_utf8_file_is_rejected(self):
+        """Test un CSV en Latin-1 o un XLSX dañado responden 400 sin crear la compra."""
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from .models import Purchase
+
+        content = (
+            'producto,unidad,cantidad,costo_total\n'
+            f'{self.flour.id},{self.purchase_unit.id},2,2000\n'
+            'azúcar,Saco 1kg,1,1500\n'
+        ).encode('latin-1')
+        response = self.post_file(SimpleUploadedFile('factura.csv', content))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('UTF-8', response.data['error'])
+        self.assertFalse(Purchase.objects.exists())
+        self.flour.refresh_from_db()
+        self.assertEqual(self.flour.current_stock, Decimal('0.000'))
+
+        try:
+            import openpyxl  # noqa: F401
+        except ImportError:
+            return
+        response = self.post_file(SimpleUploadedFile('factura.xlsx', b'no es un zip'), number='F-2')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_xlsx_import(self):
+        """Test importación desde XLSX."""
+        try:
+            from openpyxl import Workbook
+        except ImportError:
+            self.skipTest('openpyxl no está instalado')
+        import io
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(['product', 'purchase_unit', 'quantity_purchased', 'total_cost'])
+        sheet.append([self.flour.id, self.purchase_unit.id, 2, 2000])
+        buffer = io.BytesIO()
+        workbook.save(buffer)
+
+        response = self.post_file(SimpleUploadedFile('factura.xlsx', buffer.getvalue()))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['imported_rows'], 1)
+
+    def test_management_command(self):
+        """Test el comando importa el archivo en lotes."""
+        import os
+        import tempfile
+        from django.core.management import call_command
+        from .models import Purchase
+
+        rows = ''.join(f'Harina,Saco 1kg,1,1000,fila {n}\n' for n in range(25))
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as file:
+            file.write('product,purchase_unit,quantity,total\n' + rows)
+        try:
+            call_command(
+                'import_purchase_invoice', file.name,
+                supplier=self.supplier.id, date='2024-01-31', document_number='CMD-1',
+                chunk_size=10, batch_size=7, stdout=mock.MagicMock(),
+            )
+        finally:
+            os.unlink(file.name)
+
+        purchase = Purchase.objects.get(document_number='CMD-1')
+        self.assertEqual(purchase.items.count(), 25)
+        self.assertEqual(purchase.total_amount, Decimal('25000.00'))
+        self.flour.refresh_from_db()
+        self.assertEqual(self.flour.current_stock, Decimal('25000.000'))
+
+
+class CsvExportTest(TestCase):
+    """Tests para las exportaciones CSV en streaming."""
+
+    def setUp(self):
+        from datetime import date
+        from .models import Purchase, PurchaseItem
+
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='exporter', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+
+        category = Category.objects.create(name='Export Category')
+        unit = UnitOfMeasure.objects.create(name='Gramo', abbreviation='g')
+        purchase_unit = PurchaseUnit.objects.create(
+            name='Saco 1kg', base_unit=unit, conversion_factor=Decimal('1000')
+        )
+        supplier = Supplier.objects.create(name='Export Supplier', rut='44444444-4')
+        purchase = Purchase.objects.create(
+            supplier=supplier, purchase_date=date(2024, 1, 1),
+            document_type='BOLETA', document_number='E-1',
+        )
+        for n in range(5):
+            product = Product.objects.create(
+                name=f'Insumo {n}', category=category, inventory_unit=unit
+            )
+            PurchaseItem.objects.create(
+                purchase=purchase, product=product, quantity_purchased=Decimal('1'),
+                purchase_unit=purchase_unit, total_cost=Decimal('2000'),
+            )
+
+    def get_csv(self, url_name, **params):
+        import csv
+        from django.test import override_settings
+        from django.urls import reverse
+
+        with override_settings(EXPORT_CHUNK_SIZE=2):
+            response = self.client.get(reverse(url_name), params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertTrue(response.streaming)
+            content = b''.join(response.streaming_content).decode('utf-8-sig')
+        return list(csv.reader(content.splitlines()))
+
+    def test_stock_valuation(self):
+        """Test la valorización multiplica stock por costo y agrega el total."""
+        rows = self.get_csv('product-stock-valuation')
+        self.assertEqual(len(rows), 7)
+        self.assertEqual(rows[1][-1], '2000.00')
+        self.assertEqual(rows[-1][1:], ['TOTAL', '', '', '', '', '10000.00'])
+
+    def test_purchase_exports(self):
+        """Test las compras y sus ítems se exportan en bloques."""
+        purchases = self.get_csv('purchase-export')
+        self.assertEqual([row[5] for row in purchases[1:]], ['E-1'])
+
+        items = self.get_csv('purchase-item-export', product=Product.objects.get(name='Insumo 3').id)
+        self.assertEqual(len(items), 2)
+        self.assertEqual(items[1][7], 'Insumo 3')
+        self.assertEqual(len(self.get_csv('purchase-item-export')), 6)
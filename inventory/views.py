@@ -2,12 +2,20 @@
 Views (ViewSets) para la aplicación Inventory.
 """
 
+from datetime import datetime, time
 from decimal import Decimal
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from rest_framework import viewsets, filters, status
 from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import Category, UnitOfMeasure, Product, PurchaseUnit, Purchase, PurchaseItem
+from operations_service.exports import iter_queryset, stream_csv_response
+from .models import Category, UnitOfMeasure, Product, PurchaseUnit, Purchase, PurchaseItem, StockMovement
 from .serializers import (
     CategorySerializer,
     UnitOfMeasureSerializer,
@@ -17,7 +25,9 @@ from .serializers import (
     PurchaseSerializer,
     PurchaseListSerializer,
     PurchaseCreateSerializer,
+    PurchaseImportSerializer,
     PurchaseItemSerializer,
+    StockMovementSerializer,
 )
 
 
@@ -46,7 +56,7 @@ class UnitOfMeasureViewSet(viewsets.ModelViewSet):
 class PurchaseUnitViewSet(viewsets.ModelViewSet):
     """ViewSet para CRUD de unidades de compra."""
     
-    queryset = PurchaseUnit.objects.all()
+    queryset = PurchaseUnit.objects.select_related('base_unit')
     serializer_class = PurchaseUnitSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['base_unit']
@@ -58,7 +68,7 @@ class PurchaseUnitViewSet(viewsets.ModelViewSet):
 class ProductViewSet(viewsets.ModelViewSet):
     """ViewSet para CRUD de productos."""
     
-    queryset = Product.objects.all()
+    queryset = Product.objects.select_related('category', 'inventory_unit')
     serializer_class = ProductSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['category', 'inventory_unit', 'is_active']
@@ -74,34 +84,118 @@ class ProductViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def low_stock(self, request):
-        """Obtener productos con stock bajo."""
-        low_stock_products = [p for p in self.get_queryset() if p.is_low_stock]
-        serializer = ProductListSerializer(low_stock_products, many=True)
+        """Obtener productos con stock bajo (filtrado en la base y paginado)."""
+        queryset = self.filter_queryset(self.get_queryset()).low_stock()
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = ProductListSerializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = ProductListSerializer(queryset, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'])
+    def stock_valuation(self, request):
+        """
+        Exportar a CSV la valorización del stock actual (stock × costo promedio).
+        Acepta los mismos filtros del listado; la última fila es el total.
+        """
+        queryset = self.filter_queryset(
+            Product.objects.select_related('category', 'inventory_unit')
+        ).annotate(
+            valuation=ExpressionWrapper(
+                F('current_stock') * F('average_cost'),
+                output_field=DecimalField(max_digits=24, decimal_places=5)
+            )
+        )
+        
+        def rows():
+            total = Decimal('0')
+            for product in iter_queryset(queryset):
+                valuation = product.valuation or Decimal('0')
+                total += valuation
+                yield [
+                    product.id,
+                    product.name,
+                    product.category.name,
+                    product.inventory_unit.abbreviation,
+                    product.current_stock,
+                    product.average_cost,
+                    valuation.quantize(Decimal('0.01')),
+                ]
+            yield ['', 'TOTAL', '', '', '', '', total.quantize(Decimal('0.01'))]
+        
+        return stream_csv_response(
+            f'valorizacion_stock_{timezone.localdate()}.csv',
+            ['id', 'producto', 'categoria', 'unidad', 'stock', 'costo_promedio', 'valorizacion'],
+            rows()
+        )
+
     @action(detail=True, methods=['get'])
     def stock_history(self, request, pk=None):
-        """Obtener historial de movimientos de stock del producto."""
+        """
+        Obtener historial de movimientos de stock del producto.
+        
+        Paginación por cursor (keyset): `?before=<id>` retorna los movimientos
+        anteriores a ese id y `?limit=` define el tamaño de página (1 a 200).
+        Opcionalmente `?as_of=<fecha>` calcula el stock a esa fecha.
+        """
         product = self.get_object()
         
-        # Obtener compras del producto
-        purchases = product.purchase_items.all().order_by('-created_at')[:20]
-        purchase_serializer = PurchaseItemSerializer(purchases, many=True)
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 50)), 200))
+            before = request.query_params.get('before')
+            before = int(before) if before else None
+        except ValueError:
+            return Response(
+                {'error': 'before y limit deben ser números enteros'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        return Response({
+        movements = product.stock_movements.order_by('-id')
+        if before is not None:
+            movements = movements.filter(id__lt=before)
+        movements = list(movements[:limit + 1])
+        
+        has_more = len(movements) > limit
+        movements = movements[:limit]
+        
+        data = {
             'product_id': product.id,
             'product_name': product.name,
             'current_stock': product.current_stock,
             'average_cost': product.average_cost,
-            'purchases': purchase_serializer.data,
-        })
+            'movements': StockMovementSerializer(movements, many=True).data,
+            'next_cursor': movements[-1].id if has_more else None,
+        }
+        
+        as_of = request.query_params.get('as_of')
+        if as_of:
+            try:
+                moment = parse_datetime(as_of) or parse_date(as_of)
+            except ValueError:
+                # Formato válido pero fecha inexistente (ej: 2024-02-30)
+                moment = None
+            if moment is None:
+                return Response(
+                    {'error': 'as_of debe ser una fecha (YYYY-MM-DD) o fecha y hora ISO'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if not isinstance(moment, datetime):
+                # Una fecha incluye todos los movimientos de ese día
+                moment = datetime.combine(moment, time.max)
+            if timezone.is_naive(moment):
+                moment = timezone.make_aware(moment)
+            data['as_of'] = moment
+            data['stock_as_of'] = product.stock_as_of(moment)
+        
+        return Response(data)
 
     @action(detail=True, methods=['post'])
     def adjust_stock(self, request, pk=None):
         """Ajustar el stock de un producto manualmente."""
         product = self.get_object()
         
-        adjustment_type = request.data.get('tipo_ajuste')  # 'entrada' o 'salida'
+        adjustment_type = request.data.get('tipo_ajuste')  # 'entrada', 'salida' o 'merma'
         quantity = request.data.get('cantidad')
         reason = request.data.get('razon', '')
         
@@ -124,27 +218,35 @@ class ProductViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Aplicar ajuste
+        # Aplicar ajuste con un UPDATE atómico (sin leer-modificar-escribir)
         if adjustment_type == 'entrada':
-            product.current_stock += quantity
-        elif adjustment_type == 'salida':
-            if product.current_stock < quantity:
+            product.update_stock_and_cost(
+                quantity_change=quantity,
+                movement_type='ADJUSTMENT',
+                notes=reason
+            )
+        elif adjustment_type in ('salida', 'merma'):
+            movement_type = 'WASTE' if adjustment_type == 'merma' else 'ADJUSTMENT'
+            with transaction.atomic():
+                # Solo descuenta si hay stock suficiente al momento del UPDATE
+                updated = Product.objects.filter(
+                    pk=product.pk,
+                    current_stock__gte=quantity
+                ).apply_stock_changes({product.pk: -quantity})
+                if updated:
+                    StockMovement.record({product.pk: -quantity}, movement_type, notes=reason)
+            product.refresh_from_db(fields=['current_stock', 'average_cost', 'low_stock', 'low_stock_alerted', 'updated_at'])
+            if not updated:
                 return Response(
                     {'error': f'Stock insuficiente. Stock actual: {product.current_stock}'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            product.current_stock -= quantity
         else:
             return Response(
-                {'error': 'tipo_ajuste debe ser "entrada" o "salida"'},
+                {'error': 'tipo_ajuste debe ser "entrada", "salida" o "merma"'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        product.save()
-        
-        # TODO: Registrar el ajuste en un modelo de auditoría
-        # Por ahora solo retornamos el producto actualizado
-        
         serializer = self.get_serializer(product)
         return Response({
             'message': f'Ajuste de stock aplicado: {adjustment_type} de {quantity} unidades',
@@ -156,13 +258,22 @@ class ProductViewSet(viewsets.ModelViewSet):
 class PurchaseViewSet(viewsets.ModelViewSet):
     """ViewSet para CRUD de compras."""
     
-    queryset = Purchase.objects.all()
+    queryset = Purchase.objects.select_related('supplier').annotate(items_count=Count('items'))
     serializer_class = PurchaseSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['supplier', 'document_type', 'purchase_date']
     search_fields = ['document_number', 'supplier__name', 'notes']
     ordering_fields = ['purchase_date', 'total_amount', 'created_at']
     ordering = ['-purchase_date']
+    # Orden indexado para ?pagination=cursor
+    cursor_ordering = ['-purchase_date', '-id']
+
+    def get_queryset(self):
+        """Precargar los ítems solo fuera del listado, que muestra solo su cantidad."""
+        queryset = super().get_queryset()
+        if self.action != 'list':
+            queryset = queryset.prefetch_related('items__product', 'items__purchase_unit')
+        return queryset
 
     def get_serializer_class(self):
         """Usar serializers específicos según la acción."""
@@ -185,14 +296,109 @@ class PurchaseViewSet(viewsets.ModelViewSet):
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Exportar a CSV las compras, con los mismos filtros del listado."""
+        queryset = self.filter_queryset(Purchase.objects.select_related('supplier'))
+        rows = (
+            [
+                purchase.id,
+                purchase.purchase_date,
+                purchase.supplier.name,
+                purchase.supplier.rut,
+                purchase.document_type,
+                purchase.document_number,
+                purchase.total_amount,
+                purchase.notes,
+            ]
+            for purchase in iter_queryset(queryset)
+        )
+        return stream_csv_response(
+            f'compras_{timezone.localdate()}.csv',
+            ['id', 'fecha', 'proveedor', 'rut', 'tipo_documento', 'numero_documento', 'total', 'notas'],
+            rows
+        )
+
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
+    def import_invoice(self, request):
+        """
+        Importar una factura de proveedor desde un archivo CSV o XLSX.
+        
+        Columnas: product (id o nombre), purchase_unit (id o nombre),
+        quantity_purchased, total_cost y notes opcional. Las filas válidas
+        se agregan a la compra y las inválidas se informan por número de fila.
+        """
+        from .importers import InvoiceImportError, import_invoice
+        
+        serializer = PurchaseImportSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        purchase_data = dict(serializer.validated_data)
+        upload = purchase_data.pop('file')
+        
+        try:
+            purchase, summary = import_invoice(
+                upload,
+                upload.name,
+                purchase_data,
+                chunk_size=settings.PURCHASE_IMPORT_CHUNK_SIZE,
+                batch_size=settings.PURCHASE_IMPORT_BATCH_SIZE,
+            )
+        except InvoiceImportError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        if purchase is None:
+            return Response(
+                {'error': 'El archivo no tiene filas válidas', **summary},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(
+            {'purchase': PurchaseListSerializer(purchase).data, **summary},
+            status=status.HTTP_201_CREATED
+        )
+
 
 class PurchaseItemViewSet(viewsets.ModelViewSet):
     """ViewSet para CRUD de ítems de compra."""
     
-    queryset = PurchaseItem.objects.all()
+    queryset = PurchaseItem.objects.select_related('product', 'purchase_unit')
     serializer_class = PurchaseItemSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['purchase', 'product']
     search_fields = ['product__name', 'notes']
     ordering_fields = ['created_at']
     ordering = ['-created_at']
+    # Orden indexado para ?pagination=cursor
+    cursor_ordering = ['-created_at', '-id']
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Exportar a CSV los ítems de compra, con los mismos filtros del listado."""
+        queryset = self.filter_queryset(
+            PurchaseItem.objects.select_related('purchase__supplier', 'product', 'purchase_unit')
+        )
+        rows = (
+            [
+                item.id,
+                item.purchase_id,
+                item.purchase.purchase_date,
+                item.purchase.supplier.name,
+                item.purchase.document_type,
+                item.purchase.document_number,
+                item.product_id,
+                item.product.name,
+                item.quantity_purchased,
+                item.purchase_unit.name,
+                item.total_cost,
+                item.calculated_net_cost_per_base_unit,
+            ]
+            for item in iter_queryset(queryset)
+        )
+        return stream_csv_response(
+            f'items_compra_{timezone.localdate()}.csv',
+            [
+                'id', 'compra_id', 'fecha', 'proveedor', 'tipo_documento', 'numero_documento',
+                'producto_id', 'producto', 'cantidad', 'unidad_compra', 'costo_total',
+                'costo_neto_unidad_base',
+            ],
+            rows
+        )
@@ -1,6 +1,6 @@
 from django.db import models
 from django.core.validators import EmailValidator
-from website_config.models import SingletonModel
+from operations_service.models import SingletonModel
 
 
 class LoyaltyProgram(SingletonModel):
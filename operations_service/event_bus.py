@@ -0,0 +1,69 @@
+"""
+Publicación de eventos en el bus de eventos (RabbitMQ).
+
+Los publicadores comparten un pool de productores por proceso (kombu
+`producers`/`connections`), de modo que cada evento reutiliza una
+conexión AMQP abierta en lugar de pagar un handshake por mensaje.
+Las conexiones usan publisher confirms: `publish` no retorna hasta que
+el broker confirma el mensaje.
+"""
+
+from contextlib import contextmanager
+
+from django.conf import settings
+from kombu import Connection, Exchange
+from kombu.pools import producers
+
+# Exchange de eventos de operaciones (consumido por otros microservicios)
+EVENT_EXCHANGE = Exchange('operations_events', type='topic', durable=True)
+
+_connection = None
+
+
+def get_connection():
+    """
+    Retorna la conexión plantilla del pool.
+    El pool la clona por cada conexión real; kombu reinicia los pools
+    al hacer fork, por lo que cada worker de Celery tiene los suyos.
+    """
+    global _connection
+    if _connection is None:
+        _connection = Connection(
+            settings.EVENT_BUS_URL,
+            transport_options={'confirm_publish': True},
+        )
+    return _connection
+
+
+@contextmanager
+def acquire_producer():
+    """Toma un productor del pool; se devuelve al salir del bloque."""
+    with producers[get_connection()].acquire(
+        block=True,
+        timeout=settings.EVENT_BUS_POOL_TIMEOUT,
+    ) as producer:
+        yield producer
+
+
+def publish_event(event_data, routing_key, exchange=EVENT_EXCHANGE, producer=None):
+    """
+    Publica un evento usando un productor del pool.
+    
+    Args:
+        event_data: Payload del evento (serializable a JSON)
+        routing_key: Routing key del evento (ej: 'product.stock.updated')
+        exchange: Exchange de destino
+        producer: Productor ya adquirido (para publicar varios eventos seguidos)
+    """
+    if producer is None:
+        with acquire_producer() as producer:
+            return publish_event(event_data, routing_key, exchange, producer)
+    
+    producer.publish(
+        event_data,
+        exchange=exchange,
+        routing_key=routing_key,
+        serializer='json',
+        declare=[exchange],
+        retry=True,
+    )
@@ -0,0 +1,68 @@
+"""
+Exportación de listados a CSV en streaming.
+
+Las filas se leen en bloques de EXPORT_CHUNK_SIZE y se escriben a la
+respuesta a medida que se generan, por lo que la memoria usada no depende
+de la cantidad de filas.
+"""
+
+import csv
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+
+
+class _Echo:
+    """Buffer que retorna lo escrito en lugar de guardarlo."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(header, rows):
+    """
+    Genera las líneas CSV del encabezado y de cada fila.
+
+    Args:
+        header: Lista con los nombres de columna
+        rows: Iterable de filas (listas o tuplas)
+    """
+    writer = csv.writer(_Echo())
+    # BOM para que Excel detecte UTF-8
+    yield '\ufeff' + writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def iter_queryset(queryset, chunk_size=None):
+    """
+    Recorre el queryset en bloques ordenados por id (keyset), sin cachearlo.
+
+    Cada bloque es una consulta `id > último id LIMIT chunk_size`. Se usa
+    en lugar de queryset.iterator() porque mysqlclient trae el resultado
+    completo a memoria aunque se indique chunk_size.
+    """
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    queryset = queryset.order_by('pk')
+    last_pk = None
+    while True:
+        chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        chunk = list(chunk[:chunk_size])
+        if not chunk:
+            return
+        yield from chunk
+        last_pk = chunk[-1].pk
+
+
+def stream_csv_response(filename, header, rows):
+    """
+    Retorna una respuesta CSV que se envía mientras se generan las filas.
+
+    Args:
+        filename: Nombre sugerido para la descarga
+        header: Lista con los nombres de columna
+        rows: Iterable (idealmente un generador) de filas
+    """
+    response = StreamingHttpResponse(iter_csv(header, rows), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
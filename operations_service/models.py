@@ -0,0 +1,64 @@
+"""
+Modelos base compartidos por las aplicaciones del servicio.
+"""
+
+import copy
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models, transaction
+
+
+# Cache local (por proceso) de instancias singleton: {label: (versión, expira, instancia)}
+_singleton_cache = {}
+
+
+class SingletonModel(models.Model):
+    """
+    Clase base para modelos que solo deben tener una instancia.
+    
+    load() mantiene la instancia en un cache local del proceso con TTL
+    (SINGLETON_CACHE_TTL). Cada guardado incrementa una versión en la cache
+    compartida, de modo que los demás procesos y workers descartan su copia
+    en la siguiente lectura sin consultar la base de datos.
+    """
+    
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        self.pk = 1
+        super().save(*args, **kwargs)
+        
+        label = self._meta.label_lower
+        _singleton_cache.pop(label, None)
+        transaction.on_commit(lambda: type(self)._bump_cache_version())
+
+    def delete(self, *args, **kwargs):
+        pass
+
+    @classmethod
+    def _cache_version_key(cls):
+        return f'singleton:version:{cls._meta.label_lower}'
+
+    @classmethod
+    def _bump_cache_version(cls):
+        _singleton_cache.pop(cls._meta.label_lower, None)
+        cache.add(cls._cache_version_key(), 0, timeout=None)
+        cache.incr(cls._cache_version_key())
+
+    @classmethod
+    def load(cls):
+        """
+        Retorna la instancia única, sin consultar la base si la copia local
+        sigue vigente. Retorna una copia para que modificarla no altere el cache.
+        """
+        label = cls._meta.label_lower
+        version = cache.get(cls._cache_version_key(), 0)
+        entry = _singleton_cache.get(label)
+        if entry is not None and entry[0] == version and entry[1] > time.monotonic():
+            return copy.copy(entry[2])
+        
+        obj, created = cls.objects.get_or_create(pk=1)
+        _singleton_cache[label] = (version, time.monotonic() + settings.SINGLETON_CACHE_TTL, obj)
+        return copy.copy(obj)
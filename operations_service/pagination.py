@@ -0,0 +1,48 @@
+"""
+Paginación de la API interna.
+
+Por defecto se usa paginación por número de página. Con ?pagination=cursor,
+las vistas que declaran `cursor_ordering` usan paginación por cursor (keyset):
+no ejecuta COUNT(*) ni OFFSET, por lo que las páginas profundas cuestan lo
+mismo que la primera.
+"""
+
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Paginación por cursor sobre el orden indexado de la vista (`cursor_ordering`).
+    El parámetro ?ordering no aplica en este modo.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+    def get_ordering(self, request, queryset, view):
+        return tuple(view.cursor_ordering)
+
+
+class PageNumberOrCursorPagination(PageNumberPagination):
+    """
+    Paginación por número de página, con paginación por cursor opcional
+    por request (?pagination=cursor) en las vistas que la soportan.
+    """
+    cursor_pagination_class = KeysetCursorPagination
+    cursor_paginator = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        if request.query_params.get('pagination') == 'cursor' and getattr(view, 'cursor_ordering', None):
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def to_html(self):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.to_html()
+        return super().to_html()
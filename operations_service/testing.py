@@ -0,0 +1,35 @@
+"""
+Utilidades compartidas por los tests de las aplicaciones.
+"""
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+
+class ConstantQueriesMixin:
+    """
+    Regresión N+1 para listados de la API.
+
+    Las clases de test implementan add_row(), que crea una fila (con sus
+    relaciones) visible en los listados a verificar.
+    """
+
+    def add_row(self):
+        raise NotImplementedError
+
+    def assertConstantListQueries(self, url_name, extra_rows=3):
+        """
+        Verifica que el listado ejecute las mismas consultas con 1 y con
+        1 + extra_rows filas. Retorna la segunda respuesta.
+        """
+        url = reverse(url_name)
+        self.add_row()
+        with CaptureQueriesContext(connection) as few:
+            self.assertEqual(self.client.get(url).status_code, 200, url_name)
+        for _ in range(extra_rows):
+            self.add_row()
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(url)
+        self.assertEqual(len(many), len(few), url_name)
+        return response
@@ -4,9 +4,12 @@ Gestiona recetas y sus ingredientes con cálculo automático de costos.
 """
 
 from django.db import models
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from django.core.validators import MinValueValidator
 from decimal import Decimal
 from django.db import transaction
+from django.utils import timezone
 
 
 class Recipe(models.Model):
@@ -84,11 +87,16 @@ class Recipe(models.Model):
         """
         with transaction.atomic():
             total = Decimal('0.00')
+            ingredients = list(self.ingredients.select_related('product'))
             
-            for ingredient in self.ingredients.all():
+            for ingredient in ingredients:
                 ingredient_cost = ingredient.calculate_cost()
                 total += ingredient_cost
             
+            # Persistir el costo calculado de los ingredientes
+            if ingredients:
+                RecipeIngredient.objects.bulk_update(ingredients, ['calculated_cost'])
+            
             self.total_cost = total
             
             # Calcular costo por unidad
@@ -104,20 +112,118 @@ class Recipe(models.Model):
     def save(self, *args, **kwargs):
         """Al guardar, recalcular costos si ya tiene ingredientes."""
         is_new = self.pk is None
-        super().save(*args, **kwargs)
         
-        # Si no es nueva, recalcular costos
-        if not is_new:
-            self.calculate_cost()
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            
+            # Si no es nueva, recalcular costos. calculate_cost guarda con
+            # update_fields, por lo que esos guardados no vuelven a recalcular.
+            if not is_new and kwargs.get('update_fields') is None:
+                self.calculate_cost()
+                self.enqueue_updated_event()
+
+    @classmethod
+    def recalculate_for_products(cls, product_ids):
+        """
+        Recalcula solo las recetas que usan alguno de los productos dados.
+        
+        Usa el índice (product, recipe) de RecipeIngredient para encontrar
+        las recetas afectadas en lugar de recorrer todas las recetas.
+        
+        Args:
+            product_ids: IDs de productos cuyo costo promedio cambió
+            
+        Returns:
+            Lista de recetas cuyo costo cambió
+        """
+        product_ids = list(product_ids)
+        if not product_ids:
+            return []
+        
+        with transaction.atomic():
+            # Actualizar el costo de los ingredientes afectados en un solo UPDATE
+            from inventory.models import Product
+            RecipeIngredient.objects.filter(product_id__in=product_ids).update(
+                calculated_cost=ExpressionWrapper(
+                    F('quantity_needed') * F('conversion_factor') * Subquery(
+                        Product.objects.filter(pk=OuterRef('product_id')).values('average_cost')[:1]
+                    ),
+                    output_field=DecimalField(max_digits=12, decimal_places=4)
+                )
+            )
+            
+            recipe_ids = RecipeIngredient.objects.filter(
+                product_id__in=product_ids
+            ).values('recipe_id').distinct()
+            return cls.recalculate_costs(recipe_ids)
+
+    @classmethod
+    def recalculate_costs(cls, recipe_ids):
+        """
+        Recalcula el costo de un conjunto de recetas con una sola consulta agregada.
+        
+        Guarda con bulk_update solo las recetas cuyo costo cambió y registra
+        su evento RECIPE_UPDATED en el outbox.
+        
+        Args:
+            recipe_ids: IDs (o subconsulta de IDs) de las recetas a recalcular
             
-            # Publicar evento de actualización de receta
-            from recipes.tasks import publish_recipe_updated
-            publish_recipe_updated.delay(
-                recipe_id=self.id,
-                recipe_name=self.name,
-                total_cost=float(self.total_cost),
-                cost_per_unit=float(self.cost_per_unit)
+        Returns:
+            Lista de recetas cuyo costo cambió
+        """
+        cost_field = DecimalField(max_digits=24, decimal_places=10)
+        recipes = cls.objects.filter(id__in=recipe_ids).annotate(
+            new_total_cost=Coalesce(
+                Sum(
+                    F('ingredients__quantity_needed')
+                    * F('ingredients__conversion_factor')
+                    * F('ingredients__product__average_cost'),
+                    output_field=cost_field
+                ),
+                Value(Decimal('0')),
+                output_field=cost_field
             )
+        )
+        
+        changed = []
+        now = timezone.now()
+        for recipe in recipes:
+            new_total = Decimal(recipe.new_total_cost).quantize(Decimal('0.01'))
+            if recipe.yield_quantity > 0:
+                new_per_unit = (new_total / recipe.yield_quantity).quantize(Decimal('0.0001'))
+            else:
+                new_per_unit = Decimal('0.0000')
+            
+            if new_total != recipe.total_cost or new_per_unit != recipe.cost_per_unit:
+                recipe.total_cost = new_total
+                recipe.cost_per_unit = new_per_unit
+                recipe.updated_at = now
+                changed.append(recipe)
+        
+        if changed:
+            with transaction.atomic():
+                cls.objects.bulk_update(changed, ['total_cost', 'cost_per_unit', 'updated_at'])
+                for recipe in changed:
+                    recipe.enqueue_updated_event()
+        
+        return changed
+
+    def enqueue_updated_event(self):
+        """Registra el evento RECIPE_UPDATED en el outbox de la transacción en curso."""
+        from inventory.models import OutboxEvent
+        
+        OutboxEvent.enqueue(
+            event_type='RECIPE_UPDATED',
+            routing_key='recipe.updated',
+            aggregate_type='recipe',
+            aggregate_id=self.id,
+            payload={
+                'recipe_id': self.id,
+                'recipe_name': self.name,
+                'total_cost': float(self.total_cost),
+                'cost_per_unit': float(self.cost_per_unit),
+            }
+        )
 
 
 class RecipeIngredient(models.Model):
@@ -174,6 +280,10 @@ class RecipeIngredient(models.Model):
         verbose_name_plural = "Ingredientes de Receta"
         ordering = ['recipe', 'product']
         unique_together = [['recipe', 'product']]
+        indexes = [
+            # Índice producto -> receta para recalcular solo las recetas afectadas
+            models.Index(fields=['product', 'recipe']),
+        ]
 
     def __str__(self):
         return f"{self.product.name} - {self.quantity_needed} {self.unit}"
@@ -36,7 +36,7 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
 class RecipeSerializer(serializers.ModelSerializer):
     """Serializer completo para el modelo Recipe."""
     ingredients = RecipeIngredientSerializer(many=True, read_only=True)
-    ingredients_count = serializers.IntegerField(source='ingredients.count', read_only=True)
+    ingredients_count = serializers.SerializerMethodField()
     
     class Meta:
         model = Recipe
@@ -57,11 +57,16 @@ class RecipeSerializer(serializers.ModelSerializer):
             'updated_at',
         ]
         read_only_fields = ['id', 'total_cost', 'cost_per_unit', 'created_at', 'updated_at']
+    
+    def get_ingredients_count(self, obj):
+        """Usa el conteo anotado por el ViewSet; si no existe, lo consulta."""
+        count = getattr(obj, 'ingredients_count', None)
+        return obj.ingredients.count() if count is None else count
 
 
 class RecipeListSerializer(serializers.ModelSerializer):
     """Serializer simplificado para listado de recetas."""
-    ingredients_count = serializers.IntegerField(source='ingredients.count', read_only=True)
+    ingredients_count = serializers.SerializerMethodField()
     
     class Meta:
         model = Recipe
@@ -75,6 +80,11 @@ class RecipeListSerializer(serializers.ModelSerializer):
             'ingredients_count',
             'is_active',
         ]
+    
+    def get_ingredients_count(self, obj):
+        """Usa el conteo anotado por el ViewSet; si no existe, lo consulta."""
+        count = getattr(obj, 'ingredients_count', None)
+        return obj.ingredients.count() if count is None else count
 
 
 class RecipeCreateSerializer(serializers.ModelSerializer):
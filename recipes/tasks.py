@@ -4,16 +4,16 @@ Gestiona eventos de actualización de recetas.
 """
 
 import logging
+import time
+from decimal import Decimal
 from celery import shared_task
-from kombu import Connection, Exchange
-from django.conf import settings
+from django.db import transaction
+from django.db.models import DecimalField, ExpressionWrapper, F
 from django.utils import timezone
+from operations_service.event_bus import publish_event
 
 logger = logging.getLogger(__name__)
 
-# Configuración del Event Bus
-EVENT_EXCHANGE = Exchange('operations_events', type='topic', durable=True)
-
 
 @shared_task(bind=True, max_retries=3)
 def publish_recipe_updated(self, recipe_id, recipe_name, total_cost, cost_per_unit):
@@ -36,15 +36,7 @@ def publish_recipe_updated(self, recipe_id, recipe_name, total_cost, cost_per_un
             'timestamp': str(timezone.now()),
         }
         
-        with Connection(settings.EVENT_BUS_URL) as conn:
-            producer = conn.Producer()
-            producer.publish(
-                event_data,
-                exchange=EVENT_EXCHANGE,
-                routing_key='recipe.updated',
-                serializer='json',
-                retry=True,
-            )
+        publish_event(event_data, routing_key='recipe.updated')
         
         logger.info(f"Evento RECIPE_UPDATED publicado para receta {recipe_id}: {recipe_name}")
         return {'status': 'success', 'recipe_id': recipe_id}
@@ -55,11 +47,69 @@ def publish_recipe_updated(self, recipe_id, recipe_name, total_cost, cost_per_un
 
 
 @shared_task
-def recalculate_all_recipe_costs():
+def recalculate_all_recipe_costs(bulk=True, batch_size=1000):
     """
     Tarea programada para recalcular los costos de todas las recetas activas.
     Útil cuando hay cambios masivos en los costos de productos.
+    
+    Args:
+        bulk: Si es True, calcula los costos con consultas agregadas y los
+              guarda con bulk_update. Si es False, recorre receta por receta.
+        batch_size: Tamaño de lote para bulk_update de ingredientes
+    """
+    started = time.monotonic()
+    if bulk:
+        result = _recalculate_recipe_costs_bulk(batch_size)
+    else:
+        result = _recalculate_recipe_costs_per_recipe()
+    result['elapsed_ms'] = round((time.monotonic() - started) * 1000, 1)
+    result['mode'] = 'bulk' if bulk else 'per_recipe'
+    
+    logger.info(
+        f"Recálculo de recetas ({result['mode']}): {result['updated_count']} de "
+        f"{result['total_recipes']} actualizadas en {result['elapsed_ms']} ms"
+    )
+    return result
+
+
+def _recalculate_recipe_costs_bulk(batch_size):
+    """
+    Recalcula todas las recetas activas con consultas por conjunto:
+    una para los ingredientes y una agregada (SUM agrupado por receta).
     """
+    from recipes.models import Recipe, RecipeIngredient
+    
+    cost_field = DecimalField(max_digits=24, decimal_places=10)
+    ingredients = RecipeIngredient.objects.filter(recipe__is_active=True).annotate(
+        new_cost=ExpressionWrapper(
+            F('quantity_needed') * F('conversion_factor') * F('product__average_cost'),
+            output_field=cost_field
+        )
+    ).only('id', 'calculated_cost').order_by()
+    
+    changed_ingredients = []
+    for ingredient in ingredients.iterator(chunk_size=batch_size):
+        new_cost = Decimal(ingredient.new_cost).quantize(Decimal('0.0001'))
+        if new_cost != ingredient.calculated_cost:
+            ingredient.calculated_cost = new_cost
+            changed_ingredients.append(ingredient)
+    
+    with transaction.atomic():
+        RecipeIngredient.objects.bulk_update(
+            changed_ingredients, ['calculated_cost'], batch_size=batch_size
+        )
+        active_ids = Recipe.objects.filter(is_active=True).values('id')
+        changed_recipes = Recipe.recalculate_costs(active_ids)
+    
+    return {
+        'total_recipes': Recipe.objects.filter(is_active=True).count(),
+        'updated_count': len(changed_recipes),
+        'updated_ingredients': len(changed_ingredients),
+    }
+
+
+def _recalculate_recipe_costs_per_recipe():
+    """Recalcula receta por receta (modo original)."""
     from recipes.models import Recipe
     
     recipes = Recipe.objects.filter(is_active=True)
@@ -67,23 +117,19 @@ def recalculate_all_recipe_costs():
     
     for recipe in recipes:
         try:
-            old_cost = recipe.total_cost
-            new_cost = recipe.calculate_cost()
-            
-            if old_cost != new_cost:
-                updated_count += 1
-                logger.info(
-                    f"Receta '{recipe.name}' actualizada: "
-                    f"${old_cost} -> ${new_cost}"
-                )
+            with transaction.atomic():
+                old_cost = recipe.total_cost
+                new_cost = recipe.calculate_cost()
                 
-                # Publicar evento
-                publish_recipe_updated.delay(
-                    recipe_id=recipe.id,
-                    recipe_name=recipe.name,
-                    total_cost=float(new_cost),
-                    cost_per_unit=float(recipe.cost_per_unit)
-                )
+                if old_cost != new_cost:
+                    updated_count += 1
+                    logger.info(
+                        f"Receta '{recipe.name}' actualizada: "
+                        f"${old_cost} -> ${new_cost}"
+                    )
+                    
+                    # Registrar evento en el outbox
+                    recipe.enqueue_updated_event()
                 
         except Exception as e:
             logger.error(f"Error recalculando receta {recipe.id}: {e}")
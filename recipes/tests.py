@@ -8,7 +8,8 @@ from rest_framework.test import APIClient
 from rest_framework import status
 from decimal import Decimal
 from .models import Recipe, RecipeIngredient
-from inventory.models import Category, UnitOfMeasure, Product
+from inventory.models import Category, UnitOfMeasure, Product, OutboxEvent
+from operations_service.testing import ConstantQueriesMixin
 
 User = get_user_model()
 
@@ -55,6 +56,22 @@ class RecipeModelTest(TestCase):
         recipe.refresh_from_db()
         self.assertEqual(recipe.total_cost, Decimal('1000.00'))
 
+    def test_recipe_update_enqueues_event(self):
+        """Test actualizar una receta registra el evento en el outbox."""
+        recipe = Recipe.objects.create(
+            name='Recipe with Event',
+            yield_quantity=Decimal('2.000'),
+            yield_unit='Porciones'
+        )
+        self.assertFalse(OutboxEvent.objects.exists())
+
+        recipe.description = 'Nueva descripción'
+        recipe.save()
+
+        event = OutboxEvent.objects.get()
+        self.assertEqual(event.event_type, 'RECIPE_UPDATED')
+        self.assertEqual(event.aggregate_id, str(recipe.id))
+
 
 class RecipeAPITest(TestCase):
     """Tests para la API de Recipes."""
@@ -99,3 +116,129 @@ class RecipeAPITest(TestCase):
         )
         response = self.client.get('/api/operations/recipes/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class RecipeCostDependencyTest(TestCase):
+    """Tests para el recálculo de recetas afectadas por un cambio de costo."""
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Dependency Category')
+        self.unit = UnitOfMeasure.objects.create(name='Kilo', abbreviation='kg')
+        self.flour = Product.objects.create(
+            name='Harina', category=self.category, inventory_unit=self.unit,
+            average_cost=Decimal('2.00')
+        )
+        self.sugar = Product.objects.create(
+            name='Azúcar', category=self.category, inventory_unit=self.unit,
+            average_cost=Decimal('3.00')
+        )
+        self.bread = Recipe.objects.create(name='Pan', yield_quantity=Decimal('4.000'), yield_unit='Unidades')
+        self.candy = Recipe.objects.create(name='Dulce', yield_quantity=Decimal('1.000'), yield_unit='Unidades')
+        RecipeIngredient.objects.create(
+            recipe=self.bread, product=self.flour, quantity_needed=Decimal('2.000'), unit='kg'
+        )
+        RecipeIngredient.objects.create(
+            recipe=self.candy, product=self.sugar, quantity_needed=Decimal('1.000'), unit='kg'
+        )
+
+    def test_only_affected_recipes_are_recalculated(self):
+        """Test un cambio de costo recalcula solo las recetas que usan el producto."""
+        Product.objects.filter(pk__in=[self.flour.pk, self.sugar.pk]).update(average_cost=Decimal('5.00'))
+
+        changed = Recipe.recalculate_for_products([self.flour.id])
+
+        self.assertEqual([r.id for r in changed], [self.bread.id])
+        self.bread.refresh_from_db()
+        self.candy.refresh_from_db()
+        self.assertEqual(self.bread.total_cost, Decimal('10.00'))
+        self.assertEqual(self.bread.cost_per_unit, Decimal('2.5000'))
+        self.assertEqual(self.candy.total_cost, Decimal('3.00'))
+        self.assertEqual(
+            self.bread.ingredients.get().calculated_cost, Decimal('10.0000')
+        )
+        self.assertTrue(
+            OutboxEvent.objects.filter(event_type='RECIPE_UPDATED', aggregate_id=str(self.bread.id)).exists()
+        )
+
+    def test_unchanged_cost_is_not_saved(self):
+        """Test recetas sin cambio de costo no se guardan ni emiten eventos."""
+        OutboxEvent.objects.all().delete()
+
+        changed = Recipe.recalculate_for_products([self.flour.id])
+
+        self.assertEqual(changed, [])
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_recalculate_all_bulk_mode(self):
+        """Test recálculo masivo con consultas agregadas."""
+        from recipes.tasks import recalculate_all_recipe_costs
+
+        Product.objects.filter(pk=self.sugar.pk).update(average_cost=Decimal('4.50'))
+
+        with self.assertNumQueries(10):
+            result = recalculate_all_recipe_costs()
+
+        self.assertEqual(result['mode'], 'bulk')
+        self.assertEqual(result['updated_count'], 1)
+        self.assertIn('elapsed_ms', result)
+        self.candy.refresh_from_db()
+        self.assertEqual(self.candy.total_cost, Decimal('4.50'))
+        self.assertEqual(self.candy.ingredients.get().calculated_cost, Decimal('4.5000'))
+
+
+class RecipeListQueryCountTest(ConstantQueriesMixin, TestCase):
+    """Regresión: el listado de recetas ejecuta un número constante de consultas."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='queries', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+
+        category = Category.objects.create(name='Query Category')
+        unit = UnitOfMeasure.objects.create(name='Gramo', abbreviation='g')
+        self.product = Product.objects.create(name='Harina', category=category, inventory_unit=unit)
+        self.rows = 0
+
+    def add_row(self):
+        self.rows += 1
+        recipe = Recipe.objects.create(
+            name=f'Receta {self.rows}', yield_quantity=Decimal('1.000'), yield_unit='Unidad'
+        )
+        RecipeIngredient.objects.create(
+            recipe=recipe, product=self.product, quantity_needed=Decimal('1.000'), unit='g'
+        )
+
+    def test_recipes_list(self):
+        response = self.assertConstantListQueries('recipe-list')
+        self.assertEqual(response.data['results'][0]['ingredients_count'], 1)
+
+
+class RecipeExportTest(TestCase):
+    """Tests para la exportación CSV de costos de recetas."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='export', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+
+        for n in range(5):
+            Recipe.objects.create(
+                name=f'Receta {n}', yield_quantity=Decimal('1.000'), yield_unit='Unidades',
+                total_cost=Decimal(n), is_active=n != 4
+            )
+
+    def test_export_streams_filtered_recipes(self):
+        """Test el CSV incluye todas las recetas filtradas, leídas en bloques."""
+        import csv
+        from django.test import override_settings
+        from django.urls import reverse
+
+        with override_settings(EXPORT_CHUNK_SIZE=2):
+            response = self.client.get(reverse('recipe-export'), {'is_active': 'true'})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertTrue(response.streaming)
+            content = b''.join(response.streaming_content).decode('utf-8-sig')
+
+        rows = list(csv.reader(content.splitlines()))
+        self.assertEqual(rows[0][1], 'receta')
+        self.assertEqual([row[1] for row in rows[1:]], [f'Receta {n}' for n in range(4)])
@@ -5,7 +5,10 @@ Views (ViewSets) para la aplicación Recipes.
 from rest_framework import viewsets, filters, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from django.db.models import Count
+from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
+from operations_service.exports import iter_queryset, stream_csv_response
 from .models import Recipe, RecipeIngredient
 from .serializers import (
     RecipeSerializer,
@@ -18,7 +21,7 @@ from .serializers import (
 class RecipeViewSet(viewsets.ModelViewSet):
     """ViewSet para CRUD de recetas."""
     
-    queryset = Recipe.objects.all()
+    queryset = Recipe.objects.annotate(ingredients_count=Count('ingredients'))
     serializer_class = RecipeSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['is_active', 'yield_unit']
@@ -26,6 +29,13 @@ class RecipeViewSet(viewsets.ModelViewSet):
     ordering_fields = ['name', 'total_cost', 'cost_per_unit', 'preparation_time', 'created_at']
     ordering = ['name']
 
+    def get_queryset(self):
+        """Precargar los ingredientes solo fuera del listado, que muestra solo su cantidad."""
+        queryset = super().get_queryset()
+        if self.action != 'list':
+            queryset = queryset.prefetch_related('ingredients__product__inventory_unit')
+        return queryset
+
     def get_serializer_class(self):
         """Usar serializers específicos según la acción."""
         if self.action == 'list':
@@ -34,6 +44,32 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return RecipeCreateSerializer
         return RecipeSerializer
 
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Exportar a CSV los costos de las recetas, con los mismos filtros del listado."""
+        queryset = self.filter_queryset(
+            Recipe.objects.annotate(ingredients_count=Count('ingredients'))
+        )
+        rows = (
+            [
+                recipe.id,
+                recipe.name,
+                recipe.yield_quantity,
+                recipe.yield_unit,
+                recipe.ingredients_count,
+                recipe.total_cost,
+                recipe.cost_per_unit,
+                recipe.is_active,
+            ]
+            for recipe in iter_queryset(queryset)
+        )
+        return stream_csv_response(
+            f'costos_recetas_{timezone.localdate()}.csv',
+            ['id', 'receta', 'rendimiento', 'unidad_rendimiento', 'ingredientes',
+             'costo_total', 'costo_por_unidad', 'activa'],
+            rows
+        )
+
     @action(detail=True, methods=['post'])
     def recalculate_cost(self, request, pk=None):
         """Recalcular el costo de una receta."""
@@ -90,7 +126,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
 class RecipeIngredientViewSet(viewsets.ModelViewSet):
     """ViewSet para CRUD de ingredientes de recetas."""
     
-    queryset = RecipeIngredient.objects.all()
+    queryset = RecipeIngredient.objects.select_related('product__inventory_unit')
     serializer_class = RecipeIngredientSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['recipe', 'product']
@@ -3,26 +3,7 @@ Modelo Singleton para configuración global del restaurante
 """
 from django.db import models
 from django.core.exceptions import ValidationError
-
-
-class SingletonModel(models.Model):
-    """
-    Modelo abstracto que asegura que solo exista una instancia
-    """
-    class Meta:
-        abstract = True
-    
-    def save(self, *args, **kwargs):
-        self.pk = 1
-        super().save(*args, **kwargs)
-    
-    def delete(self, *args, **kwargs):
-        pass
-    
-    @classmethod
-    def load(cls):
-        obj, created = cls.objects.get_or_create(pk=1)
-        return obj
+from operations_service.models import SingletonModel
 
 
 class RestaurantConfig(SingletonModel):
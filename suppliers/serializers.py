@@ -9,10 +9,7 @@ from .models import Supplier, SupplierCategory
 class SupplierCategorySerializer(serializers.ModelSerializer):
     """Serializer para el modelo SupplierCategory."""
     
-    suppliers_count = serializers.IntegerField(
-        source='suppliers.count',
-        read_only=True
-    )
+    suppliers_count = serializers.SerializerMethodField()
     
     class Meta:
         model = SupplierCategory
@@ -25,6 +22,11 @@ class SupplierCategorySerializer(serializers.ModelSerializer):
             'updated_at',
         ]
         read_only_fields = ['id', 'created_at', 'updated_at', 'suppliers_count']
+    
+    def get_suppliers_count(self, obj):
+        """Usa el conteo anotado por el ViewSet; si no existe, lo consulta."""
+        count = getattr(obj, 'suppliers_count', None)
+        return obj.suppliers.count() if count is None else count
 
 
 class SupplierSerializer(serializers.ModelSerializer):
@@ -6,6 +6,7 @@ from django.test import TestCase
 from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient
 from rest_framework import status
+from operations_service.testing import ConstantQueriesMixin
 from .models import Supplier
 
 User = get_user_model()
@@ -67,3 +68,27 @@ class SupplierAPITest(TestCase):
         Supplier.objects.create(**self.supplier_data)
         response = self.client.get('/api/operations/suppliers/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class SupplierListQueryCountTest(ConstantQueriesMixin, TestCase):
+    """Regresión: los listados de proveedores ejecutan un número constante de consultas."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='queries', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.rows = 0
+
+    def add_row(self):
+        from .models import SupplierCategory
+
+        self.rows += 1
+        category = SupplierCategory.objects.create(name=f'Categoría {self.rows}')
+        Supplier.objects.create(name=f'Proveedor {self.rows}', rut=f'{self.rows}-9', category=category)
+
+    def test_suppliers_list(self):
+        self.assertConstantListQueries('supplier-list')
+
+    def test_supplier_categories_list(self):
+        response = self.assertConstantListQueries('supplier-category-list')
+        self.assertEqual(response.data['results'][0]['suppliers_count'], 1)
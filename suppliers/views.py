@@ -5,6 +5,7 @@ Views (ViewSets) para la aplicación Suppliers.
 from rest_framework import viewsets, filters, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from django.db.models import Count
 from django_filters.rest_framework import DjangoFilterBackend
 from .models import Supplier, SupplierCategory
 from .serializers import (
@@ -26,7 +27,7 @@ class SupplierCategoryViewSet(viewsets.ModelViewSet):
     destroy: Eliminar categoría
     """
     
-    queryset = SupplierCategory.objects.all()
+    queryset = SupplierCategory.objects.annotate(suppliers_count=Count('suppliers'))
     serializer_class = SupplierCategorySerializer
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['name', 'description']
@@ -54,7 +55,7 @@ class SupplierViewSet(viewsets.ModelViewSet):
     destroy: Eliminar proveedor (soft delete)
     """
     
-    queryset = Supplier.objects.all()
+    queryset = Supplier.objects.select_related('category')
     serializer_class = SupplierSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['is_active', 'category', 'city', 'region']
@@ -88,7 +89,9 @@ class SupplierViewSet(viewsets.ModelViewSet):
     def purchases(self, request, pk=None):
         """Obtener compras del proveedor."""
         supplier = self.get_object()
-        purchases = supplier.purchases.all().order_by('-purchase_date')[:10]
+        purchases = supplier.purchases.select_related('supplier').annotate(
+            items_count=Count('items')
+        ).order_by('-purchase_date')[:10]
         
         from inventory.serializers import PurchaseListSerializer
         serializer = PurchaseListSerializer(purchases, many=True)
@@ -4,9 +4,8 @@ Estos endpoints son consumidos por el frontend website.
 """
 
 from rest_framework import serializers
-from inventory.models import Product, Category
 from website_config.models import WebsiteSettings, GalleryImage
-from blog.models import BlogPost
+from blog.models import BlogPost, BlogTag
 from legal.models import LegalPage
 from reservations.models import Reservation
 from loyalty_club.models import LoyaltyProgram, ClubMember
@@ -94,51 +93,6 @@ class GalleryImageSerializer(serializers.ModelSerializer):
         return None
 
 
-# ==========================================
-# Menu Serializers
-# ==========================================
-
-class CategorySimpleSerializer(serializers.ModelSerializer):
-    """Categoría simplificada para el menú web."""
-    
-    class Meta:
-        model = Category
-        fields = ['id', 'name', 'description']
-
-
-class WebMenuProductSerializer(serializers.ModelSerializer):
-    """Productos para el menú web."""
-    
-    category_name = serializers.CharField(source='category.name', read_only=True)
-    category_id = serializers.IntegerField(source='category.id', read_only=True)
-    image_url = serializers.SerializerMethodField()
-    description_display = serializers.SerializerMethodField()
-    
-    class Meta:
-        model = Product
-        fields = [
-            'id',
-            'name',
-            'description_display',
-            'category_id',
-            'category_name',
-            'image_url',
-            'web_price',
-            'display_order',
-        ]
-    
-    def get_image_url(self, obj):
-        if obj.image:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.image.url)
-            return obj.image.url
-        return None
-    
-    def get_description_display(self, obj):
-        return obj.get_web_description()
-
-
 # ==========================================
 # Blog Serializers
 # ==========================================
@@ -221,6 +175,16 @@ class BlogPostDetailSerializer(serializers.ModelSerializer):
         return None
 
 
+class BlogTagSerializer(serializers.ModelSerializer):
+    """Tag del blog con su cantidad de posts publicados."""
+    
+    post_count = serializers.IntegerField(read_only=True)
+    
+    class Meta:
+        model = BlogTag
+        fields = ['name', 'slug', 'post_count']
+
+
 # ==========================================
 # Legal Pages Serializers
 # ==========================================
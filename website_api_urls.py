@@ -10,6 +10,7 @@ from website_api_views import (
     WebMenuView,
     BlogPostListView,
     BlogPostDetailView,
+    BlogTagListView,
     LegalPageListView,
     LegalPageDetailView,
     ReservationCreateView,
@@ -31,6 +32,7 @@ urlpatterns = [
     
     # Blog
     path('blog/', BlogPostListView.as_view(), name='blog-list'),
+    path('blog/tags/', BlogTagListView.as_view(), name='blog-tags'),
     path('blog/<slug:slug>/', BlogPostDetailView.as_view(), name='blog-detail'),
     
     # Páginas legales
@@ -7,13 +7,18 @@ from rest_framework import viewsets, generics, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
+import hashlib
+from django.conf import settings
+from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
-from django.db.models import Q
+from django.db.models import Count, Max
 from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date, parse_etags
 
-from inventory.models import Product, Category
 from website_config.models import WebsiteSettings, GalleryImage
-from blog.models import BlogPost
+from website_config.utils import get_content_version, get_menu_version, get_public_menu_json
+from blog.models import BlogPost, BlogTag
 from legal.models import LegalPage
 from reservations.models import Reservation
 from loyalty_club.models import LoyaltyProgram, ClubMember
@@ -21,10 +26,9 @@ from loyalty_club.models import LoyaltyProgram, ClubMember
 from website_api_serializers import (
     WebsiteSettingsSerializer,
     GalleryImageSerializer,
-    CategorySimpleSerializer,
-    WebMenuProductSerializer,
     BlogPostListSerializer,
     BlogPostDetailSerializer,
+    BlogTagSerializer,
     LegalPageSerializer,
     ReservationCreateSerializer,
     ReservationResponseSerializer,
@@ -34,11 +38,80 @@ from website_api_serializers import (
 )
 
 
+# ==========================================
+# Conditional GET
+# ==========================================
+
+class ConditionalGetMixin:
+    """
+    Agrega ETag, Last-Modified y Cache-Control a las vistas GET públicas.
+    
+    Las vistas implementan get_etag_source() con datos baratos de obtener
+    (versión de contenido o máximo de updated_at) que cambian cuando cambia
+    la respuesta. Si el ETag coincide con If-None-Match se responde 304 sin
+    serializar nada.
+    
+    cache_max_age define el max-age de Cache-Control para cada vista
+    (por defecto WEBSITE_API_CACHE_MAX_AGE). Con weak_etag el ETag es débil
+    (W/"..."): la respuesta es semánticamente equivalente pero puede
+    diferir en datos que no forman parte del ETag.
+    """
+    cache_max_age = None
+    weak_etag = False
+    
+    def get_etag_source(self, request, *args, **kwargs):
+        """
+        Retorna (partes, last_modified): valores que identifican el contenido
+        de la respuesta y la fecha de su último cambio (o None).
+        """
+        raise NotImplementedError
+    
+    def get_fresh_response(self, request, *args, **kwargs):
+        """Construye la respuesta completa (por defecto, el GET de la vista genérica)."""
+        return super().get(request, *args, **kwargs)
+    
+    def get_etag(self, request, *args, **kwargs):
+        parts, last_modified = self.get_etag_source(request, *args, **kwargs)
+        # La query string es parte del contenido (filtros, página)
+        source = '|'.join(str(part) for part in (type(self).__name__, *parts, request.GET.urlencode()))
+        etag = f'"{hashlib.sha1(source.encode("utf-8")).hexdigest()}"'
+        return (f'W/{etag}' if self.weak_etag else etag), last_modified
+    
+    def get(self, request, *args, **kwargs):
+        etag, last_modified = self.get_etag(request, *args, **kwargs)
+        
+        # If-None-Match usa comparación débil (RFC 9110): se ignora el prefijo W/
+        if_none_match = request.headers.get('If-None-Match')
+        client_etags = {tag.removeprefix('W/') for tag in parse_etags(if_none_match or '')}
+        if if_none_match and (etag.removeprefix('W/') in client_etags or if_none_match.strip() == '*'):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = self.get_fresh_response(request, *args, **kwargs)
+        
+        if response.status_code not in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            return response
+        
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+        max_age = self.cache_max_age
+        if max_age is None:
+            max_age = settings.WEBSITE_API_CACHE_MAX_AGE
+        patch_cache_control(response, public=True, max_age=max_age)
+        return response
+
+
+def _queryset_etag_source(queryset):
+    """Partes del ETag de un listado: cantidad de filas y último updated_at."""
+    state = queryset.order_by().aggregate(count=Count('id'), last_modified=Max('updated_at'))
+    return (state['count'], state['last_modified']), state['last_modified']
+
+
 # ==========================================
 # Website Config Views
 # ==========================================
 
-class WebsiteConfigView(generics.RetrieveAPIView):
+class WebsiteConfigView(ConditionalGetMixin, generics.RetrieveAPIView):
     """
     GET /api/website/config/
     Obtener la configuración pública del sitio web.
@@ -48,9 +121,13 @@ class WebsiteConfigView(generics.RetrieveAPIView):
     
     def get_object(self):
         return WebsiteSettings.load()
+    
+    def get_etag_source(self, request, *args, **kwargs):
+        updated_at = WebsiteSettings.load().updated_at
+        return (updated_at,), updated_at
 
 
-class GalleryImageListView(generics.ListAPIView):
+class GalleryImageListView(ConditionalGetMixin, generics.ListAPIView):
     """
     GET /api/website/gallery/
     Obtener imágenes de la galería.
@@ -72,65 +149,60 @@ class GalleryImageListView(generics.ListAPIView):
             queryset = queryset.filter(is_featured=True)
         
         return queryset
+    
+    def get_etag_source(self, request, *args, **kwargs):
+        # GalleryImage no tiene updated_at: se usa su versión de contenido
+        return ('gallery', get_content_version('gallery')), None
 
 
 # ==========================================
 # Menu Views
 # ==========================================
 
-class WebMenuView(generics.GenericAPIView):
+class WebMenuView(ConditionalGetMixin, generics.GenericAPIView):
     """
     GET /api/website/menu/
     Obtener el menú público con productos activos para la web.
     """
     permission_classes = [AllowAny]
     
-    def get(self, request):
-        # Obtener productos activos en la web
-        products = Product.objects.filter(
-            is_active=True,
-            is_active_website=True
-        ).select_related('category').order_by('display_order', 'category__name', 'name')
-        
+    def get_fresh_response(self, request, *args, **kwargs):
         # Filtrar por categoría si se proporciona
         category_id = request.query_params.get('category', None)
         if category_id:
-            products = products.filter(category_id=category_id)
-        
-        # Obtener categorías que tienen productos activos
-        categories = Category.objects.filter(
-            products__is_active=True,
-            products__is_active_website=True
-        ).distinct().order_by('name')
-        
-        # Serializar
-        product_serializer = WebMenuProductSerializer(
-            products,
-            many=True,
-            context={'request': request}
-        )
-        category_serializer = CategorySimpleSerializer(categories, many=True)
+            try:
+                category_id = int(category_id)
+            except ValueError:
+                return Response(
+                    {'error': 'category debe ser un número entero'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        else:
+            category_id = None
         
-        return Response({
-            'categories': category_serializer.data,
-            'products': product_serializer.data,
-            'menu_title': WebsiteSettings.load().menu_title,
-            'menu_description': WebsiteSettings.load().menu_description,
-            'menu_footer_text': WebsiteSettings.load().menu_footer_text,
-        })
+        # Servir el JSON ya serializado del menú versionado, con las URLs de
+        # imágenes absolutas para el origen de la solicitud
+        content = get_public_menu_json(category_id, request.build_absolute_uri('/'))
+        return HttpResponse(content, content_type='application/json')
+    
+    def get_etag_source(self, request, *args, **kwargs):
+        return ('menu', get_menu_version()), None
 
 
 # ==========================================
 # Blog Views
 # ==========================================
 
-class BlogPostListView(generics.ListAPIView):
+class BlogPostListView(ConditionalGetMixin, generics.ListAPIView):
     """
     GET /api/website/blog/
     Listar posts publicados del blog.
     """
     permission_classes = [AllowAny]
     serializer_class = BlogPostListSerializer
+    # views_count no es parte del ETag: con un 304 el contador puede estar
+    # desactualizado hasta que cambie el listado o venza max-age
+    weak_etag = True
     
     def get_queryset(self):
         queryset = BlogPost.objects.filter(
@@ -143,19 +215,21 @@ class BlogPostListView(generics.ListAPIView):
         if category:
             queryset = queryset.filter(category__iexact=category)
         
-        # Filtrar por tag si se proporciona
-        tag = self.request.query_params.get('tag', None)
-        if tag:
-            queryset = queryset.filter(tags__contains=[tag])
+        # Filtrar por tags (índice BlogPostTag). Acepta ?tag=a&tag=b o ?tag=a,b
+        # y ?tag_match=all para exigir todos (por defecto basta uno)
+        tags = [
+            tag
+            for value in self.request.query_params.getlist('tag')
+            for tag in value.split(',')
+        ]
+        if tags:
+            match = self.request.query_params.get('tag_match', 'any')
+            queryset = queryset.with_tags(tags, match='all' if match == 'all' else 'any')
         
-        # Buscar por texto
+        # Buscar por texto (índice invertido, ordenado por relevancia)
         search = self.request.query_params.get('search', None)
         if search:
-            queryset = queryset.filter(
-                Q(title__icontains=search) |
-                Q(content__icontains=search) |
-                Q(excerpt__icontains=search)
-            )
+            queryset = queryset.search(search)
         
         # Solo destacados
         featured = self.request.query_params.get('featured', None)
@@ -163,9 +237,19 @@ class BlogPostListView(generics.ListAPIView):
             queryset = queryset.filter(is_featured=True)
         
         return queryset
+    
+    def get_etag_source(self, request, *args, **kwargs):
+        return _queryset_etag_source(self.filter_queryset(self.get_queryset()))
+    
+    def paginate_queryset(self, queryset):
+        # Mostrar las vistas de la base más las pendientes de escribir
+        page = super().paginate_queryset(queryset)
+        if page is None:
+            return None
+        return BlogPost.add_pending_views(page)
 
 
-class BlogPostDetailView(generics.RetrieveAPIView):
+class BlogPostDetailView(ConditionalGetMixin, generics.RetrieveAPIView):
     """
     GET /api/website/blog/{slug}/
     Obtener detalle de un post del blog.
@@ -173,6 +257,9 @@ class BlogPostDetailView(generics.RetrieveAPIView):
     permission_classes = [AllowAny]
     serializer_class = BlogPostDetailSerializer
     lookup_field = 'slug'
+    # Cada GET suma una vista, así que views_count no puede ser parte del
+    # ETag (nunca habría 304); el contador mostrado es aproximado
+    weak_etag = True
     
     def get_queryset(self):
         return BlogPost.objects.filter(
@@ -180,19 +267,51 @@ class BlogPostDetailView(generics.RetrieveAPIView):
             published_date__lte=timezone.now()
         )
     
-    def retrieve(self, request, *args, **kwargs):
+    def get_etag_source(self, request, *args, **kwargs):
+        # Una respuesta 304 también cuenta como visita
         instance = self.get_object()
-        # Incrementar contador de vistas
+        BlogPost.add_pending_views([instance])
         instance.increment_views()
+        self._instance = instance
+        return (instance.pk, instance.updated_at), instance.updated_at
+    
+    def retrieve(self, request, *args, **kwargs):
+        instance = self._instance
         serializer = self.get_serializer(instance)
         return Response(serializer.data)
 
 
+class BlogTagListView(ConditionalGetMixin, generics.ListAPIView):
+    """
+    GET /api/website/blog/tags/
+    Nube de tags: tags con su cantidad de posts publicados.
+    """
+    permission_classes = [AllowAny]
+    serializer_class = BlogTagSerializer
+    pagination_class = None
+    
+    def get_published_posts(self):
+        return BlogPost.objects.filter(
+            status='published',
+            published_date__lte=timezone.now()
+        )
+    
+    def get_queryset(self):
+        return BlogTag.objects.filter(
+            post_links__post__in=self.get_published_posts()
+        ).annotate(
+            post_count=Count('post_links')
+        ).order_by('-post_count', 'name')
+    
+    def get_etag_source(self, request, *args, **kwargs):
+        return _queryset_etag_source(self.get_published_posts())
+
+
 # ==========================================
 # Legal Pages Views
 # ==========================================
 
-class LegalPageListView(generics.ListAPIView):
+class LegalPageListView(ConditionalGetMixin, generics.ListAPIView):
     """
     GET /api/website/legal/
     Listar páginas legales activas.
@@ -202,9 +321,12 @@ class LegalPageListView(generics.ListAPIView):
     
     def get_queryset(self):
         return LegalPage.objects.filter(is_active=True).order_by('order', 'title')
+    
+    def get_etag_source(self, request, *args, **kwargs):
+        return _queryset_etag_source(self.get_queryset())
 
 
-class LegalPageDetailView(generics.RetrieveAPIView):
+class LegalPageDetailView(ConditionalGetMixin, generics.RetrieveAPIView):
     """
     GET /api/website/legal/{slug}/
     Obtener una página legal específica.
@@ -215,6 +337,12 @@ class LegalPageDetailView(generics.RetrieveAPIView):
     
     def get_queryset(self):
         return LegalPage.objects.filter(is_active=True)
+    
+    def get_etag_source(self, request, *args, **kwargs):
+        state = self.get_queryset().filter(slug=kwargs.get('slug')).values('pk', 'updated_at').first()
+        if state is None:
+            return ('missing',), None
+        return (state['pk'], state['updated_at']), state['updated_at']
 
 
 # ==========================================
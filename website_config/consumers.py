@@ -5,7 +5,7 @@ Maneja las conexiones en tiempo real con las pantallas de TV.
 import json
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
-from .utils import get_public_menu_data
+from .utils import get_menu_snapshot
 
 
 class SignageConsumer(AsyncWebsocketConsumer):
@@ -13,8 +13,14 @@ class SignageConsumer(AsyncWebsocketConsumer):
     Consumer que maneja la conexión WebSocket para señalización digital.
     
     Las TVs se conectan a este consumer y reciben:
-    - El menú completo al conectarse
-    - Actualizaciones en tiempo real cuando cambian productos
+    - 'menu_snapshot': el menú completo y su versión al conectarse
+    - 'menu_diff': solo los productos y categorías agregados, eliminados o
+      modificados, con la versión nueva y la versión sobre la que aplican
+      (base_version)
+    
+    Si una TV recibe un diff cuyo base_version no coincide con su versión
+    actual (se perdió un mensaje), debe enviar {"type": "resync"} para
+    recibir nuevamente el menú completo.
     """
     
     async def connect(self):
@@ -37,12 +43,7 @@ class SignageConsumer(AsyncWebsocketConsumer):
         await self.accept()
         
         # Enviar el menú actual inmediatamente al conectarse
-        current_menu_data = await self.get_menu()
-        await self.send(text_data=json.dumps({
-            'type': 'menu_update',
-            'data': current_menu_data,
-            'timestamp': self._get_timestamp(),
-        }))
+        await self.send_snapshot()
     
     async def disconnect(self, close_code):
         """
@@ -54,34 +55,69 @@ class SignageConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
     
+    async def receive(self, text_data=None, bytes_data=None):
+        """
+        Maneja mensajes enviados por la TV.
+        Soporta {"type": "resync"} para solicitar el menú completo.
+        """
+        try:
+            message = json.loads(text_data or '{}')
+        except ValueError:
+            return
+        
+        if isinstance(message, dict) and message.get('type') == 'resync':
+            await self.send_snapshot()
+    
     async def signage_update(self, event):
         """
         Maneja mensajes del tipo 'signage_update' desde el channel layer.
-        Este método es llamado cuando un signal de Django detecta cambios.
+        Este método es llamado cuando la tarea de broadcast detecta cambios.
         
         Args:
             event (dict): Evento con la estructura:
                 {
                     'type': 'signage_update',
-                    'data': {...menu data...}
+                    'version': 12,
+                    'base_version': 11,
+                    'changes': {...diferencias del menú...}
                 }
         """
-        # Reenviar el menú actualizado a la TV conectada
+        # Reenviar solo las diferencias a la TV conectada
         await self.send(text_data=json.dumps({
-            'type': 'menu_update',
-            'data': event['data'],
+            'type': 'menu_diff',
+            'version': event['version'],
+            'base_version': event['base_version'],
+            'changes': event['changes'],
             'timestamp': self._get_timestamp(),
-        }))
+        }, separators=(',', ':')))
+    
+    async def signage_snapshot(self, event):
+        """
+        Maneja mensajes del tipo 'signage_snapshot' desde el channel layer:
+        el servidor no tiene una versión base y todas las TVs reciben el menú completo.
+        """
+        await self.send_snapshot()
+    
+    async def send_snapshot(self):
+        """Envía el menú completo con su versión, usando el JSON ya serializado."""
+        snapshot = await self.get_snapshot()
+        await self.send(text_data=(
+            '{"type":"menu_snapshot","version":%d,"timestamp":%s,"data":%s}' % (
+                snapshot['version'],
+                json.dumps(self._get_timestamp()),
+                snapshot['json'].decode('utf-8'),
+            )
+        ))
     
     @database_sync_to_async
-    def get_menu(self):
+    def get_snapshot(self):
         """
-        Obtiene el menú desde la base de datos de forma asíncrona.
+        Obtiene el snapshot del menú de la versión actual de forma asíncrona.
         
         Returns:
-            dict: Menú completo con categorías y productos
+            dict: {'version': int, 'data': menú completo, 'json': bytes}
         """
-        return get_public_menu_data()
+        return get_menu_snapshot()
     
     @staticmethod
     def _get_timestamp():
@@ -1,27 +1,9 @@
-from django.db import models
+from django.db import models, transaction
+from operations_service.models import SingletonModel
 from django.core.validators import URLValidator
 from django.core.exceptions import ValidationError
 
 
-class SingletonModel(models.Model):
-    """Clase base para modelos que solo deben tener una instancia."""
-    
-    class Meta:
-        abstract = True
-
-    def save(self, *args, **kwargs):
-        self.pk = 1
-        super().save(*args, **kwargs)
-
-    def delete(self, *args, **kwargs):
-        pass
-
-    @classmethod
-    def load(cls):
-        obj, created = cls.objects.get_or_create(pk=1)
-        return obj
-
-
 class WebsiteSettings(SingletonModel):
     """
     Configuración global del sitio web (Singleton).
@@ -289,3 +271,29 @@ class GalleryImage(models.Model):
     
     def __str__(self):
         return self.title
+
+
+# ====================
+# Signals para el contenido publicado
+# ====================
+
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+
+@receiver(post_save, sender=WebsiteSettings)
+def website_settings_saved_handler(sender, instance, **kwargs):
+    """
+    Los textos del menú son parte del snapshot publicado: al guardar la
+    configuración se invalida el menú y se agenda su envío a las pantallas.
+    """
+    from .tasks import schedule_signage_broadcast
+    schedule_signage_broadcast()
+
+
+@receiver(post_save, sender=GalleryImage)
+@receiver(post_delete, sender=GalleryImage)
+def gallery_image_changed_handler(sender, instance, **kwargs):
+    """Incrementa la versión de la galería (usada en su ETag) al confirmar la transacción."""
+    from .utils import bump_content_version
+    transaction.on_commit(lambda: bump_content_version('gallery'))
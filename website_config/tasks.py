@@ -0,0 +1,111 @@
+"""
+Tareas de Celery para la aplicación Website Config.
+Gestiona el envío del menú a las pantallas de señalización digital.
+"""
+
+import logging
+import time
+from asgiref.sync import async_to_sync
+from celery import shared_task
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+SIGNAGE_GROUP = 'digital_signage'
+SIGNAGE_PENDING_KEY = 'signage:broadcast:pending'
+SIGNAGE_LAST_CHANGE_KEY = 'signage:broadcast:last_change'
+# Último menú enviado a las pantallas ({'version', 'data'}), base de los diffs
+SIGNAGE_BROADCAST_KEY = 'signage:broadcast:menu'
+
+
+def _debounce_seconds():
+    return settings.SIGNAGE_BROADCAST_DEBOUNCE_MS / 1000
+
+
+def schedule_signage_broadcast():
+    """
+    Registra un cambio del menú y agenda su envío a las pantallas con debounce.
+    
+    Al confirmarse la transacción incrementa la versión del menú (lo que
+    invalida el snapshot en cache). Cada cambio actualiza la marca del último cambio; solo el primero de
+    una ventana encola la tarea. La tarea se ejecuta en un worker de Celery
+    una vez que pasó la ventana sin nuevos cambios, de modo que una ráfaga
+    de guardados produce una sola reconstrucción del menú.
+    """
+    def _schedule():
+        from .utils import bump_menu_version
+        
+        bump_menu_version()
+        window = _debounce_seconds()
+        cache.set(SIGNAGE_LAST_CHANGE_KEY, time.time(), timeout=None)
+        # cache.add es atómico: solo un proceso encola la tarea por ventana
+        if cache.add(SIGNAGE_PENDING_KEY, 1, timeout=max(int(window * 10), 60)):
+            broadcast_signage_menu.apply_async(countdown=window)
+    
+    # Esperar al commit para que la tarea lea los datos ya guardados
+    transaction.on_commit(_schedule)
+
+
+@shared_task(bind=True, max_retries=3)
+def broadcast_signage_menu(self):
+    """
+    Reconstruye el menú público y envía a todas las pantallas conectadas
+    solo las diferencias con la versión anterior (ver SignageConsumer).
+    
+    Si hubo cambios dentro de la ventana de debounce, se reprograma para el
+    final de la ventana en lugar de enviar un menú que quedará obsoleto.
+    """
+    window = _debounce_seconds()
+    last_change = cache.get(SIGNAGE_LAST_CHANGE_KEY) or 0
+    remaining = last_change + window - time.time()
+    if remaining > 0:
+        self.apply_async(countdown=remaining)
+        return {'status': 'rescheduled', 'countdown': remaining}
+    
+    # Liberar la ventana antes de leer el menú: un cambio posterior agenda otro envío
+    cache.delete(SIGNAGE_PENDING_KEY)
+    
+    try:
+        from .utils import diff_menu_data, get_menu_snapshot
+        
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return {'status': 'no_channel_layer'}
+        
+        snapshot = get_menu_snapshot()
+        previous = cache.get(SIGNAGE_BROADCAST_KEY)
+        
+        if previous is None:
+            # Sin base conocida: las pantallas deben recibir el menú completo
+            message = {'type': 'signage_snapshot'}
+        else:
+            diff = diff_menu_data(previous['data'], snapshot['data'])
+            if diff is None and snapshot['version'] == previous['version']:
+                return {'status': 'unchanged', 'version': snapshot['version']}
+            # Sin diferencias pero con versión nueva (ej: un guardado que no
+            # afecta el menú) se envía un diff vacío para que las TVs avancen
+            # a la misma versión que reciben las que se conecten ahora
+            message = {
+                'type': 'signage_update',
+                'version': snapshot['version'],
+                'base_version': previous['version'],
+                'changes': diff or {},
+            }
+        
+        async_to_sync(channel_layer.group_send)(SIGNAGE_GROUP, message)
+        # Guardar la base de los próximos diffs solo una vez enviado el mensaje
+        cache.set(
+            SIGNAGE_BROADCAST_KEY,
+            {'version': snapshot['version'], 'data': snapshot['data']},
+            timeout=None
+        )
+        
+        logger.info(f"Cambios del menú v{snapshot['version']} enviados a señalización digital")
+        return {'status': 'success', 'version': snapshot['version']}
+    
+    except Exception as exc:
+        logger.error(f"Error enviando menú a señalización digital: {exc}")
+        raise self.retry(exc=exc, countdown=5)
@@ -0,0 +1,224 @@
+"""
+Tests para la aplicación Website Config.
+"""
+
+from decimal import Decimal
+from unittest import mock
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework import status
+from .models import WebsiteSettings
+from inventory.models import Category, UnitOfMeasure, Product
+from loyalty_club.models import LoyaltyProgram
+
+
+class SingletonCacheTest(TestCase):
+    """Tests para el cache local de modelos singleton."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_load_is_cached(self):
+        """Test lecturas repetidas no consultan la base de datos."""
+        WebsiteSettings.load()
+        LoyaltyProgram.load()
+
+        with self.assertNumQueries(0):
+            WebsiteSettings.load()
+            LoyaltyProgram.load()
+
+    @mock.patch('website_config.tasks.broadcast_signage_menu.apply_async')
+    def test_save_invalidates_cache(self, mock_apply):
+        """Test guardar invalida el cache en la siguiente lectura."""
+        website_settings = WebsiteSettings.load()
+        website_settings.menu_title = 'Menú de Temporada'
+        with self.captureOnCommitCallbacks(execute=True):
+            website_settings.save()
+
+        self.assertEqual(WebsiteSettings.load().menu_title, 'Menú de Temporada')
+
+    def test_load_returns_copy(self):
+        """Test modificar la instancia retornada no altera el cache."""
+        WebsiteSettings.load().menu_title = 'Sin guardar'
+        self.assertNotEqual(WebsiteSettings.load().menu_title, 'Sin guardar')
+
+
+class SignageBroadcastTest(TestCase):
+    """Tests para el envío con debounce del menú a la señalización digital."""
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Signage Category')
+        self.unit = UnitOfMeasure.objects.create(name='Porción', abbreviation='por')
+        self.product = Product.objects.create(
+            name='Empanada',
+            category=self.category,
+            inventory_unit=self.unit,
+            is_active_website=True,
+            web_price=Decimal('2500'),
+        )
+
+    @mock.patch('website_config.tasks.broadcast_signage_menu.apply_async')
+    def test_stock_only_changes_do_not_schedule(self, mock_apply):
+        """Test cambios solo de stock no reconstruyen el menú."""
+        product = Product.objects.get(pk=self.product.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            product.update_stock_and_cost(Decimal('5'))
+            product.current_stock = Decimal('8')
+            product.save()
+            product.save(update_fields=['current_stock', 'updated_at'])
+
+        mock_apply.assert_not_called()
+
+    @mock.patch('website_config.tasks.broadcast_signage_menu.apply_async')
+    def test_menu_changes_are_debounced(self, mock_apply):
+        """Test una ráfaga de cambios agenda un solo envío."""
+        from website_config.tasks import SIGNAGE_PENDING_KEY
+
+        cache.delete(SIGNAGE_PENDING_KEY)
+        product = Product.objects.get(pk=self.product.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            for price in ('2600', '2700', '2800'):
+                product.web_price = Decimal(price)
+                product.save()
+
+        mock_apply.assert_called_once()
+        cache.delete(SIGNAGE_PENDING_KEY)
+
+    @mock.patch('website_config.tasks.broadcast_signage_menu.apply_async')
+    def test_broadcast_reschedules_within_window(self, mock_apply):
+        """Test la tarea se reprograma si hubo cambios dentro de la ventana."""
+        import time
+        from website_config.tasks import broadcast_signage_menu, SIGNAGE_LAST_CHANGE_KEY
+
+        cache.set(SIGNAGE_LAST_CHANGE_KEY, time.time())
+        result = broadcast_signage_menu.apply().get()
+
+        self.assertEqual(result['status'], 'rescheduled')
+        mock_apply.assert_called_once()
+
+    def test_broadcast_sends_versioned_diff(self):
+        """Test la tarea envía solo las diferencias con una versión nueva."""
+        from website_config.tasks import broadcast_signage_menu, SIGNAGE_LAST_CHANGE_KEY
+        from website_config.utils import bump_menu_version
+
+        cache.clear()
+        cache.set(SIGNAGE_LAST_CHANGE_KEY, 0)
+        with mock.patch('website_config.tasks.async_to_sync') as mock_sync:
+            broadcast_signage_menu.apply().get()
+            Product.objects.filter(pk=self.product.pk).update(web_price=Decimal('3000'))
+            version = bump_menu_version()
+            result = broadcast_signage_menu.apply().get()
+            self.assertEqual(broadcast_signage_menu.apply().get()['status'], 'unchanged')
+
+        self.assertEqual(result, {'status': 'success', 'version': version})
+        first, second = [c.args[1] for c in mock_sync.return_value.call_args_list]
+        self.assertEqual(first, {'type': 'signage_snapshot'})
+        self.assertEqual(second['base_version'], version - 1)
+        self.assertEqual(
+            second['changes'],
+            {'products': {'added': [], 'removed': [], 'changed': [{'web_price': '3000.00', 'id': self.product.id}]}}
+        )
+        cache.clear()
+
+    def test_unchanged_broadcast_keeps_diff_base(self):
+        """Test una versión nueva sin cambios no deja a las TVs con una base desconocida."""
+        from website_config.tasks import broadcast_signage_menu, SIGNAGE_LAST_CHANGE_KEY
+        from website_config.utils import bump_menu_version
+
+        cache.clear()
+        cache.set(SIGNAGE_LAST_CHANGE_KEY, 0)
+        with mock.patch('website_config.tasks.async_to_sync') as mock_sync:
+            broadcast_signage_menu.apply().get()
+            # Guardado que no afecta el menú (ej: WebsiteSettings)
+            bump_menu_version()
+            broadcast_signage_menu.apply().get()
+            Product.objects.filter(pk=self.product.pk).update(web_price=Decimal('3000'))
+            bump_menu_version()
+            broadcast_signage_menu.apply().get()
+
+        messages = [c.args[1] for c in mock_sync.return_value.call_args_list]
+        self.assertEqual(len(messages), 3)
+        unchanged, changed = messages[1], messages[2]
+        self.assertEqual(unchanged['changes'], {})
+        self.assertEqual(changed['base_version'], unchanged['version'])
+        self.assertIn('products', changed['changes'])
+        cache.clear()
+
+    def test_web_menu_serves_cached_snapshot(self):
+        """Test el menú web se sirve desde el snapshot hasta que cambia la versión."""
+        import json
+        from django.urls import reverse
+        from website_config.models import WebsiteSettings
+        from website_config.utils import bump_menu_version
+
+        cache.clear()
+        WebsiteSettings.load()
+        url = reverse('website_api:web-menu')
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content)['products'][0]['web_price'], '2500.00')
+
+        Product.objects.filter(pk=self.product.pk).update(web_price=Decimal('3000'))
+        with self.assertNumQueries(0):
+            cached = self.client.get(url)
+        self.assertEqual(cached.content, response.content)
+
+        bump_menu_version()
+        response = self.client.get(url, {'category': self.category.id})
+        self.assertEqual(json.loads(response.content)['products'][0]['web_price'], '3000.00')
+        cache.clear()
+
+    def test_web_menu_image_urls_are_absolute(self):
+        """Test el menú web entrega URLs de imagen absolutas; el snapshot, rutas de media."""
+        import json
+        from django.urls import reverse
+        from website_config.utils import get_menu_snapshot
+
+        cache.clear()
+        Product.objects.filter(pk=self.product.pk).update(image='products/empanada.jpg')
+        response = self.client.get(reverse('website_api:web-menu'))
+
+        image_url = json.loads(response.content)['products'][0]['image_url']
+        self.assertTrue(image_url.startswith('http://testserver/'))
+        self.assertTrue(image_url.endswith('products/empanada.jpg'))
+        self.assertFalse(get_menu_snapshot()['data']['products'][0]['image_url'].startswith('http'))
+        cache.clear()
+
+    def test_web_menu_conditional_get(self):
+        """Test ETag del menú: 304 sin reconstruir hasta que cambia la versión."""
+        from django.urls import reverse
+        from website_config.utils import bump_menu_version
+
+        cache.clear()
+        url = reverse('website_api:web-menu')
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertIn('max-age=', response['Cache-Control'])
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+
+        bump_menu_version()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        cache.clear()
+
+    def test_diff_menu_data(self):
+        """Test diferencias de menú: agregados, eliminados y modificados."""
+        from website_config.utils import diff_menu_data
+
+        old = {'categories': [{'id': 1, 'name': 'A'}], 'products': [{'id': 1, 'name': 'X'}, {'id': 2, 'name': 'Y'}]}
+        new = {'categories': [{'id': 1, 'name': 'A'}], 'products': [{'id': 1, 'name': 'Z'}, {'id': 3, 'name': 'W'}]}
+
+        self.assertEqual(diff_menu_data(old, new), {
+            'products': {
+                'added': [{'id': 3, 'name': 'W'}],
+                'removed': [2],
+                'changed': [{'name': 'Z', 'id': 1}],
+            }
+        })
+        self.assertIsNone(diff_menu_data(old, old))
@@ -1,59 +1,207 @@
 """
 Utilidades para el módulo de configuración web.
 """
-from inventory.models import Product, Category
+import json
+from urllib.parse import urljoin
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from inventory.models import Product
 
+# Versiones de contenido publicado (ej: 'menu', 'gallery'): se incrementan
+# con cada cambio y permiten invalidar caches y ETags sin consultar la base
+CONTENT_VERSION_KEY = 'content:version:{name}'
+MENU_SNAPSHOT_KEY = 'menu:snapshot:v{version}:{scope}'
+# JSON del menú web con URLs de imágenes absolutas, uno por origen (esquema y host)
+MENU_PUBLIC_JSON_KEY = 'menu:public:v{version}:{scope}:{base_url}'
+MENU_SNAPSHOT_TIMEOUT = 60 * 60 * 24
 
-def get_public_menu_data():
+
+def get_public_menu_data(category_id=None):
     """
     Obtiene el menú completo en formato JSON para la página web pública
     y para la señalización digital.
-    
+
+    Args:
+        category_id: Si se indica, solo incluye los productos de esa categoría
+
     Returns:
-        dict: Diccionario con categorías y productos activos en la web
+        dict: Diccionario con categorías, productos activos en la web y los
+        textos del menú configurados en WebsiteSettings
     """
-    # Obtener productos activos para web ordenados por categoría y orden
+    from .models import WebsiteSettings
+
+    # Obtener productos activos para web (una sola consulta con su categoría)
     products = Product.objects.filter(
+        is_active=True,
         is_active_website=True
-    ).select_related('category').order_by('category__display_order', 'category__name', 'name')
-    
-    # Obtener categorías activas con productos
-    active_category_ids = products.values_list('category_id', flat=True).distinct()
-    categories = Category.objects.filter(
-        id__in=active_category_ids
-    ).order_by('display_order', 'name')
-    
+    ).select_related('category').order_by('display_order', 'category__name', 'name')
+
     # Construir estructura de datos
-    categories_data = []
-    for category in categories:
-        categories_data.append({
+    categories = {}
+    products_data = []
+    for product in products:
+        category = product.category
+        categories.setdefault(category.id, {
             'id': category.id,
             'name': category.name,
             'description': category.description or '',
         })
-    
-    products_data = []
-    for product in products:
-        # Determinar precio y descripción para mostrar
-        web_price = product.web_price if product.web_price else product.price
-        description_display = product.web_description if product.web_description else product.description
-        
+
+        if category_id is not None and product.category_id != category_id:
+            continue
+
         products_data.append({
             'id': product.id,
             'name': product.name,
-            'description': product.description or '',
-            'description_display': description_display or '',
+            'description_display': product.get_web_description() or '',
             'category_id': product.category_id,
-            'category_name': product.category.name,
-            'price': str(product.price),
-            'web_price': str(web_price),
-            'has_web_image': bool(product.web_image),
-            'web_image_url': product.web_image.url if product.web_image else None,
-            'allergens': product.allergens or '',
-            'is_featured': product.is_featured,
+            'category_name': category.name,
+            'image_url': product.get_image_url(),
+            'web_price': str(product.web_price) if product.web_price is not None else None,
+            'display_order': product.display_order,
         })
-    
+
+    website_settings = WebsiteSettings.load()
+
     return {
-        'categories': categories_data,
+        'categories': sorted(categories.values(), key=lambda c: c['name']),
         'products': products_data,
+        'menu_title': website_settings.menu_title,
+        'menu_description': website_settings.menu_description,
+        'menu_footer_text': website_settings.menu_footer_text,
+    }
+
+
+# ====================
+# Versiones de contenido y snapshot del menú
+# ====================
+
+def get_content_version(name):
+    """Retorna la versión actual de un contenido publicado."""
+    key = CONTENT_VERSION_KEY.format(name=name)
+    cache.add(key, 1, timeout=None)
+    return cache.get(key) or 1
+
+
+def bump_content_version(name):
+    """Incrementa la versión de un contenido publicado."""
+    key = CONTENT_VERSION_KEY.format(name=name)
+    cache.add(key, 1, timeout=None)
+    return cache.incr(key)
+
+
+def get_menu_version():
+    """Retorna la versión actual del menú."""
+    return get_content_version('menu')
+
+
+def bump_menu_version():
+    """Incrementa la versión del menú, invalidando los snapshots anteriores."""
+    return bump_content_version('menu')
+
+
+def get_menu_snapshot(category_id=None):
+    """
+    Retorna el menú de la versión actual, construyéndolo solo si no está en cache.
+
+    El snapshot incluye el menú ya serializado a JSON (bytes), de modo que
+    WebMenuView y SignageConsumer lo envían sin volver a serializar.
+
+    Args:
+        category_id: Filtra los productos por categoría (snapshot independiente)
+
+    Returns:
+        dict: {'version': int, 'data': menú, 'json': bytes}
+    """
+    version = get_menu_version()
+    scope = f'category:{category_id}' if category_id is not None else 'all'
+    key = MENU_SNAPSHOT_KEY.format(version=version, scope=scope)
+
+    snapshot = cache.get(key)
+    if snapshot is None:
+        data = get_public_menu_data(category_id)
+        snapshot = {
+            'version': version,
+            'data': data,
+            'json': json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':')).encode('utf-8'),
+        }
+        cache.set(key, snapshot, timeout=MENU_SNAPSHOT_TIMEOUT)
+    return snapshot
+
+
+def get_public_menu_json(category_id=None, base_url=''):
+    """
+    Retorna el JSON del menú web con las URLs de imágenes absolutas.
+
+    El snapshot guarda las rutas de media relativas (las pantallas las
+    resuelven contra su servidor); la API pública las entrega absolutas,
+    por lo que se renderiza y cachea un JSON por versión y origen.
+
+    Args:
+        category_id: Filtra los productos por categoría
+        base_url: Origen de la solicitud, ej: 'https://api.ejemplo.cl/'
+
+    Returns:
+        bytes: Menú serializado a JSON
+    """
+    snapshot = get_menu_snapshot(category_id)
+    scope = f'category:{category_id}' if category_id is not None else 'all'
+    key = MENU_PUBLIC_JSON_KEY.format(version=snapshot['version'], scope=scope, base_url=base_url)
+
+    content = cache.get(key)
+    if content is None:
+        data = dict(snapshot['data'])
+        data['products'] = [
+            {**product, 'image_url': urljoin(base_url, product['image_url'])}
+            if product['image_url'] else product
+            for product in data['products']
+        ]
+        content = json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':')).encode('utf-8')
+        cache.set(key, content, timeout=MENU_SNAPSHOT_TIMEOUT)
+    return content
+
+
+def _diff_items(old_items, new_items):
+    old_by_id = {item['id']: item for item in old_items}
+    new_by_id = {item['id']: item for item in new_items}
+
+    added = [item for item_id, item in new_by_id.items() if item_id not in old_by_id]
+    removed = [item_id for item_id in old_by_id if item_id not in new_by_id]
+    changed = []
+    for item_id, item in new_by_id.items():
+        old_item = old_by_id.get(item_id)
+        if old_item is None or old_item == item:
+            continue
+        # Solo los campos modificados, más el id
+        fields = {key: value for key, value in item.items() if old_item.get(key) != value}
+        fields['id'] = item_id
+        changed.append(fields)
+
+    if not (added or removed or changed):
+        return None
+    return {'added': added, 'removed': removed, 'changed': changed}
+
+
+def diff_menu_data(old_menu, new_menu):
+    """
+    Calcula las diferencias entre dos menús.
+
+    Returns:
+        dict: {'categories': {...}, 'products': {...}} con listas added,
+        removed (ids) y changed (solo campos modificados), y 'menu' con los
+        textos del menú que cambiaron; omite las secciones sin cambios.
+        None si los menús son iguales.
+    """
+    diff = {}
+    for section in ('categories', 'products'):
+        section_diff = _diff_items(old_menu.get(section, []), new_menu.get(section, []))
+        if section_diff:
+            diff[section] = section_diff
+
+    menu_changes = {
+        key: value for key, value in new_menu.items()
+        if key not in ('categories', 'products') and old_menu.get(key) != value
     }
+    if menu_changes:
+        diff['menu'] = menu_changes
+    return diff or None